@@ -0,0 +1,134 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from gomoku import GomokuGame, GomokuAI, _alternate_stones, _sync_game
+from selfplay import parse_config
+
+# AIs of a worker process by board size and configuration, kept warm between positions (or server requests)
+_worker_ais = {}
+
+
+def position_moves(record):
+    """Moves leading to a record's position: its 'moves' list, or the stones of its 'board' replayed alternately"""
+    if 'moves' in record:
+        return [(row, col) for row, col in record['moves']]
+
+    board = record['board']
+    black = [(row, col) for row, line in enumerate(board) for col, cell in enumerate(line) if cell == 1]
+    white = [(row, col) for row, line in enumerate(board) for col, cell in enumerate(line) if cell == 2]
+    if len(black) - len(white) not in (0, 1):
+        raise ValueError(f"{len(black)} black and {len(white)} white stones cannot be reached by alternating moves")
+
+    return [(row, col) for row, col, _ in _alternate_stones(black, white)]
+
+
+def _get_ai(board_size, config):
+    """The worker process's AI for a board size and configuration"""
+    key = (board_size, tuple(sorted(config.items())))
+    if key not in _worker_ais:
+        _worker_ais[key] = GomokuAI(GomokuGame(board_size), **config)
+    return _worker_ais[key]
+
+
+def analyze_line(line, config):
+    """Best move and score of the position in one JSON line
+
+    Consecutive positions of the same game only play the moves that differ, and the
+    AI's transposition table carries over between them.
+    """
+    record = {}
+    try:
+        record = json.loads(line)
+        moves = position_moves(record)
+        board_size = record.get('board_size', len(record['board']) if 'board' in record else 15)
+        ai = _get_ai(board_size, config)
+
+        _sync_game(ai.game, moves)
+        if [(row, col) for row, col, _ in ai.game.move_history] != moves:
+            raise ValueError("illegal move sequence")
+
+        move = ai.get_best_move()
+        result = {'move': list(move) if move else None, 'score': ai.last_score, 'depth': ai.completed_depth}
+    except (ValueError, KeyError, TypeError) as error:
+        result = {'error': str(error)}
+
+    if isinstance(record, dict) and 'id' in record:
+        result = {'id': record['id'], **result}
+    return result
+
+
+def analyze_chunk(config, lines):
+    """Analyze a list of JSON lines in one worker task"""
+    return [analyze_line(line, config) for line in lines]
+
+
+def _chunks(lines, chunk_size):
+    lines = (line for line in lines if line.strip())
+    while True:
+        chunk = list(itertools.islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def analyze_stream(lines, config, workers=1, chunk_size=64, max_pending=None):
+    """Analyze an iterable of JSON lines, yielding one result per position in input order
+
+    Positions are sent to the workers in chunks, and at most max_pending chunks are in flight
+    at once, so memory use does not grow with the size of the input.
+    """
+    chunks = _chunks(lines, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from analyze_chunk(config, chunk)
+        return
+
+    max_pending = max_pending or 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(analyze_chunk, config, chunk))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Best move and score for every position of a JSONL file")
+    parser.add_argument('input', nargs='?', default='-',
+                        help="JSONL positions, each with 'moves' or 'board' and an optional 'id' (default: stdin)")
+    parser.add_argument('--output', help="JSONL file for the results (default: stdout)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument('--chunk-size', type=int, default=64, help="positions sent to a worker at once")
+    parser.add_argument('--ai', default='max_depth=2', help="GomokuAI arguments, e.g. 'max_depth=3,top_k=10'")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == '-' else open(args.input)
+    output = open(args.output, 'w') if args.output else sys.stdout
+    count = 0
+    start = time.perf_counter()
+    try:
+        for result in analyze_stream(source, parse_config(args.ai), args.workers, args.chunk_size):
+            output.write(json.dumps(result) + "\n")
+            count += 1
+    finally:
+        if args.input != '-':
+            source.close()
+        if args.output:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'positions': count, 'seconds': round(elapsed, 2),
+                      'positions_per_second': round(count / elapsed, 2) if elapsed else None}), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
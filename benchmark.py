@@ -0,0 +1,311 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from gomoku import GomokuGame, BitboardGomokuGame, SparseGomokuGame, GomokuAI
+
+BACKENDS = {
+    'numpy': GomokuGame,
+    'bitboard': BitboardGomokuGame,
+    'sparse': SparseGomokuGame,
+}
+
+# Fixed positions for the search suite, as moves from the empty board
+CORPUS = {
+    'opening-1': [(7, 7)],
+    'opening-2': [(7, 7), (7, 8)],
+    'opening-3': [(7, 7), (6, 6), (6, 8)],
+    'opening-4': [(7, 7), (7, 6), (6, 6), (8, 5)],
+    'middle-1': [(7, 7), (6, 6), (6, 8), (5, 9), (4, 10), (4, 9), (3, 11), (7, 9), (6, 9), (8, 9), (2, 12), (1, 13),
+                 (8, 6), (9, 5)],
+    'middle-2': [(7, 7), (7, 8), (6, 8), (5, 9), (7, 9), (5, 7), (5, 8), (4, 8), (8, 8), (9, 9), (8, 9), (9, 8),
+                 (8, 6), (8, 7), (9, 5), (10, 4)],
+    'middle-3': [(7, 7), (7, 8), (6, 8), (5, 9), (7, 9), (5, 7), (5, 8), (4, 8), (8, 8), (9, 8), (6, 6), (9, 9),
+                 (5, 5), (4, 4), (3, 3), (9, 7), (9, 6), (9, 10), (9, 11), (8, 10)],
+    'middle-4': [(7, 7), (6, 6), (6, 8), (5, 9), (4, 10), (6, 7), (3, 11), (6, 9), (2, 12), (1, 13), (8, 6), (9, 5),
+                 (10, 4), (6, 10), (11, 3), (6, 5), (6, 4), (7, 5)],
+    'tactical-1': [(7, 7), (6, 8), (5, 7), (5, 8), (4, 7)],
+    'tactical-2': [(7, 7), (7, 6), (6, 6), (8, 5), (5, 6), (6, 7), (5, 8), (7, 8), (4, 7), (9, 4)],
+    'tactical-3': [(7, 7), (7, 8), (6, 8), (5, 9), (7, 9), (5, 7), (5, 8), (4, 8), (8, 8), (9, 9), (8, 9), (9, 8),
+                   (8, 6), (8, 7), (9, 5), (10, 4), (8, 10), (9, 6), (9, 11), (10, 12), (8, 11), (8, 12)],
+    'tactical-4': [(7, 7), (6, 6), (6, 8), (5, 9), (4, 10), (6, 7), (3, 11), (6, 9), (2, 12), (1, 13), (8, 6), (9, 5),
+                   (10, 4), (6, 10), (11, 3), (6, 5), (6, 4), (7, 5), (8, 5), (4, 8)],
+}
+
+
+def random_games(count, stones, board_size=15, seed=0):
+    """Generate move lists of random games that stay unfinished for the given number of stones"""
+    rng = random.Random(seed)
+    games = []
+
+    while len(games) < count:
+        game = GomokuGame(board_size)
+        moves = []
+        while len(moves) < stones and not game.game_over:
+            row, col = rng.choice(game.get_valid_moves())
+            game.make_move(row, col)
+            moves.append((row, col))
+
+        if not game.game_over:
+            games.append(moves)
+
+    return games
+
+
+def _time_per_call(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls
+
+
+def bench_backend(game_class, games, repeat=20):
+    """Time the board operations of one backend, in microseconds per call"""
+    results = {'make_move': 0.0, 'check_win': 0.0, 'get_valid_moves': 0.0, 'is_empty': 0.0}
+
+    for moves in games:
+        # Replay the whole game
+        def replay():
+            game = game_class()
+            for row, col in moves:
+                game.make_move(row, col)
+
+        results['make_move'] += _time_per_call(replay, repeat) / len(moves)
+
+        game = game_class()
+        for row, col in moves:
+            game.make_move(row, col)
+        last_row, last_col = moves[-1]
+
+        results['check_win'] += _time_per_call(lambda: game.check_win(last_row, last_col), repeat * 10)
+        results['get_valid_moves'] += _time_per_call(game.get_valid_moves, repeat)
+        results['is_empty'] += _time_per_call(lambda: game.is_empty(7, 7), repeat * 10)
+
+    return {name: total / len(games) * 1e6 for name, total in results.items()}
+
+
+def bench_search(game_class, games, depth):
+    """Time GomokuAI.get_best_move on each position, in milliseconds per move"""
+    total = 0.0
+    for moves in games:
+        game = game_class()
+        for row, col in moves:
+            game.make_move(row, col)
+
+        ai = GomokuAI(game, max_depth=depth)
+        start = time.perf_counter()
+        ai.get_best_move()
+        total += time.perf_counter() - start
+
+    return total / len(games) * 1e3
+
+
+def compare_backends(positions=20, stones=20, depth=2, seed=0):
+    """Print a comparison of the board backends"""
+    games = random_games(positions, stones, seed=seed)
+    baseline = None
+
+    print(f"{positions} positions with {stones} stones, search depth {depth}")
+    for name, game_class in BACKENDS.items():
+        results = bench_backend(game_class, games)
+        results['get_best_move'] = bench_search(game_class, games, depth)
+        if baseline is None:
+            baseline = results
+
+        print(f"\n{name}")
+        for operation, value in results.items():
+            unit = 'ms' if operation == 'get_best_move' else 'us'
+            print(f"  {operation:<16} {value:10.2f} {unit}  ({baseline[operation] / value:5.2f}x)")
+
+
+def load_position(moves, game_class=GomokuGame):
+    """Play a move list from the empty board"""
+    game = game_class()
+    for row, col in moves:
+        if not game.make_move(row, col):
+            raise ValueError(f"Illegal move {(row, col)} in benchmark position")
+    return game
+
+
+def measure_evaluation(games, repeat=200):
+    """Calls per second of the evaluation and move generation routines over the corpus"""
+    rates = {}
+    routines = {
+        'evaluate_position': lambda ai: ai.evaluate_position(ai.game.current_player),
+        'evaluate_board': lambda ai: ai.evaluate_board(ai.game.current_player, ai.game.board),
+        'get_valid_moves': lambda ai: ai.game.get_valid_moves(),
+    }
+
+    for name, routine in routines.items():
+        calls = repeat if name != 'evaluate_board' else max(1, repeat // 10)
+        elapsed = 0.0
+        for game in games:
+            ai = GomokuAI(game)
+            elapsed += _time_per_call(lambda: routine(ai), calls)
+        rates[name + '_per_sec'] = round(len(games) / elapsed, 1)
+
+    return rates
+
+
+def measure_search(moves, depth, search='alphabeta', quiescence=False):
+    """Search one position to a fixed depth with a fresh AI"""
+    game = load_position(moves)
+    ai = GomokuAI(game, max_depth=depth, threat_search=False, collect_stats=True, search=search,
+                  quiescence=quiescence)
+    best_move = ai.get_best_move()
+    stats = ai.stats.depths[depth]
+
+    return {
+        'move': list(best_move) if best_move else None,
+        'score': ai.last_score,
+        'nodes': stats.nodes,
+        'evaluations': stats.leaves,
+        'quiescence_nodes': stats.quiescence_nodes,
+        'cutoffs': stats.cutoffs,
+        'first_move_cutoffs': stats.first_move_cutoffs,
+        'branching_factor': round(stats.branching_factor, 3),
+        'seconds': round(stats.seconds, 6),
+    }
+
+
+def run_suite(depths=(2, 3, 4), search='alphabeta', quiescence=False):
+    """Measure evaluation speed and fixed-depth search on every corpus position"""
+    games = [load_position(moves) for moves in CORPUS.values()]
+    results = {
+        'meta': {'python': platform.python_version(), 'machine': platform.machine(), 'positions': len(CORPUS),
+                 'search': search, 'quiescence': quiescence},
+        'evaluation': measure_evaluation(games),
+        'search': {},
+    }
+
+    for depth in depths:
+        positions = {name: measure_search(moves, depth, search, quiescence) for name, moves in CORPUS.items()}
+        seconds = sum(position['seconds'] for position in positions.values())
+        nodes = sum(position['nodes'] for position in positions.values())
+        evaluations = sum(position['evaluations'] for position in positions.values())
+        quiescence_nodes = sum(position['quiescence_nodes'] for position in positions.values())
+        cutoffs = sum(position['cutoffs'] for position in positions.values())
+        first_move_cutoffs = sum(position['first_move_cutoffs'] for position in positions.values())
+        results['search'][str(depth)] = {
+            'seconds': round(seconds, 6),  # Time to reach this depth on the whole corpus
+            'nodes': nodes,
+            'nodes_per_sec': round(nodes / seconds, 1),
+            'quiescence_nodes': quiescence_nodes,  # Not part of nodes
+            'evaluations_per_sec': round(evaluations / seconds, 1),
+            'first_move_cutoff_rate': round(first_move_cutoffs / cutoffs, 3) if cutoffs else 0.0,
+            'effective_branching_factor': round((nodes / len(positions)) ** (1 / depth), 3),
+            'positions': positions,
+        }
+
+    # How often each depth already finds the deepest search's move
+    deepest = results['search'][str(max(depths))]['positions']
+    for depth in depths:
+        positions = results['search'][str(depth)]['positions']
+        agreeing = sum(positions[name]['move'] == deepest[name]['move'] for name in positions)
+        results['search'][str(depth)]['agreement_with_deepest'] = round(agreeing / len(positions), 3)
+
+    return results
+
+
+def compare_results(results, baseline, threshold=0.1, min_agreement=None):
+    """Regressions of results against a baseline run, as a list of messages"""
+    regressions = []
+
+    def check_rate(name, value, base_value):
+        if base_value and value < base_value * (1 - threshold):
+            regressions.append(f"{name}: {value} < {base_value} (-{(1 - value / base_value) * 100:.1f}%)")
+
+    for name, base_value in baseline.get('evaluation', {}).items():
+        if name in results['evaluation']:
+            check_rate(f"evaluation.{name}", results['evaluation'][name], base_value)
+
+    for depth, base_search in baseline.get('search', {}).items():
+        search = results['search'].get(depth)
+        if search is None:
+            continue
+
+        check_rate(f"search.{depth}.nodes_per_sec", search['nodes_per_sec'], base_search['nodes_per_sec'])
+        if search['seconds'] > base_search['seconds'] * (1 + threshold):
+            regressions.append(f"search.{depth}.seconds: {search['seconds']} > {base_search['seconds']} "
+                               f"(+{(search['seconds'] / base_search['seconds'] - 1) * 100:.1f}%)")
+
+        # Best moves compared with the baseline's
+        names = [name for name in search['positions'] if name in base_search['positions']]
+        if names:
+            agreeing = sum(search['positions'][name]['move'] == base_search['positions'][name]['move']
+                           for name in names)
+            search['agreement_with_baseline'] = round(agreeing / len(names), 3)
+            if min_agreement is not None and search['agreement_with_baseline'] < min_agreement:
+                regressions.append(f"search.{depth}.agreement_with_baseline: "
+                                   f"{search['agreement_with_baseline']} < {min_agreement}")
+
+    return regressions
+
+
+def print_suite(results):
+    for name, value in results['evaluation'].items():
+        print(f"{name:<28} {value:14.1f}")
+
+    print(f"\n{'depth':<6} {'seconds':>10} {'nodes':>10} {'nodes/s':>10} {'evals/s':>10} {'cut1st':>7} "
+          f"{'ebf':>6} {'agree':>6} {'qnodes':>10}")
+    for depth, search in results['search'].items():
+        print(f"{depth:<6} {search['seconds']:10.3f} {search['nodes']:10d} {search['nodes_per_sec']:10.1f} "
+              f"{search['evaluations_per_sec']:10.1f} {search['first_move_cutoff_rate']:7.2f} "
+              f"{search['effective_branching_factor']:6.2f} {search['agreement_with_deepest']:6.2f} "
+              f"{search.get('quiescence_nodes', 0):10d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gomoku engine benchmarks")
+    commands = parser.add_subparsers(dest='command')
+
+    backends = commands.add_parser('backends', help="compare the board backends")
+    backends.add_argument('--positions', type=int, default=20, help="number of random positions")
+    backends.add_argument('--stones', type=int, default=20, help="stones on the board in each position")
+    backends.add_argument('--depth', type=int, default=2, help="search depth for get_best_move")
+    backends.add_argument('--seed', type=int, default=0, help="random seed for the positions")
+
+    suite = commands.add_parser('suite', help="search benchmark on the fixed position corpus")
+    suite.add_argument('--depths', type=int, nargs='+', default=[2, 3, 4])
+    suite.add_argument('--search', choices=['alphabeta', 'pvs'], default='alphabeta', help="search algorithm")
+    suite.add_argument('--quiescence', action='store_true', help="extend the leaves with the quiescence search")
+    suite.add_argument('--output', help="write the results as JSON")
+    suite.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    suite.add_argument('--threshold', type=float, default=0.1, help="allowed slowdown before failing (0.1 = 10%%)")
+    suite.add_argument('--min-agreement', type=float, default=None,
+                       help="fail if fewer best moves than this fraction match the baseline")
+
+    args = parser.parse_args()
+
+    if args.command == 'backends':
+        compare_backends(args.positions, args.stones, args.depth, args.seed)
+        return
+
+    if args.command != 'suite':
+        parser.print_help()
+        return
+
+    results = run_suite(args.depths, args.search, args.quiescence)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_results(results, json.load(f), args.threshold, args.min_agreement)
+        results['regressions'] = regressions
+
+    print_suite(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if regressions:
+        print("\nRegressions:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import math
+import time
+
+from gomoku import GomokuGame, GomokuAI, OpeningBook
+
+
+def build_book(path, plies=4, width=3, depth=4, think_ms=None, board_size=15):
+    """Search every opening position up to the given number of stones and write the results as a book
+
+    From each position the searched best move and the width best-ordered alternatives are
+    expanded, so the book covers both colours and the replies most likely to be played.
+    Positions that are symmetric to one already searched are skipped.
+    """
+    game = GomokuGame(board_size)
+    ai = GomokuAI(game, max_depth=depth, think_ms=think_ms)
+    entries = {}
+
+    def expand():
+        key, symmetry = OpeningBook.canonical_key(board_size, game.move_history)
+        if key in entries or game.game_over:
+            return
+
+        best_move = ai.get_best_move()
+        score = ai.last_score if ai.last_score is not None else math.nan
+        forward, _ = OpeningBook.symmetries(board_size)[symmetry]
+        entries[key] = (forward[best_move[0] * board_size + best_move[1]], score)
+
+        if game.stone_count + 1 >= plies:
+            return
+
+        # Alternatives in order of how much they change the pattern scores
+        player = game.current_player
+        ranked = sorted(game.get_valid_moves(), key=lambda move: -game.patterns.threat_score(move[0], move[1], player))
+        children = [best_move]
+        for move in ranked:
+            if len(children) > width:
+                break
+            if move not in children:
+                children.append(move)
+
+        for row, col in children:
+            game.make_move(row, col)
+            expand()
+            game.undo_move()
+
+    start = time.perf_counter()
+    expand()
+    OpeningBook.write(path, board_size, entries, max_stones=plies - 1)
+    print(f"Wrote {len(entries)} positions to {path} in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a Gomoku opening book")
+    parser.add_argument('path', help="output book file")
+    parser.add_argument('--plies', type=int, default=4, help="book positions have fewer stones than this")
+    parser.add_argument('--width', type=int, default=3, help="alternative moves expanded from each position")
+    parser.add_argument('--depth', type=int, default=4, help="search depth for each position")
+    parser.add_argument('--think-ms', type=int, default=None, help="search time per position instead of a fixed depth")
+    parser.add_argument('--board-size', type=int, default=15)
+    args = parser.parse_args()
+
+    build_book(args.path, args.plies, args.width, args.depth, args.think_ms, args.board_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import argparse
+import sys
+import time
+
+from gomoku import GomokuGame, GomokuAI, _alternate_stones
+from selfplay import parse_config
+
+ABOUT = 'name="Gomuku", version="1.0", author="Porsugu", country="Unknown"'
+MIN_THINK_MS = 10  # Search time when moves are wanted as fast as possible
+
+
+class GomocupEngine:
+    """One engine process speaking the Gomocup (piskvork) protocol over text lines
+
+    The game and the AI, with its transposition table and move-ordering history, live for the
+    whole game and are only replaced when START asks for another board size. Coordinates in the
+    protocol are x,y with x the column, so they are swapped on the way in and out.
+    """
+
+    def __init__(self, output=sys.stdout, ai_config=None):
+        self.output = output
+        self.ai_config = ai_config or {}
+        self.game = None
+        self.ai = None
+
+        # Time limits in milliseconds as sent by INFO. timeout_turn 0 asks for moves as fast as
+        # possible; timeout_match 0 means the match has no time limit.
+        self.timeout_turn = 30000
+        self.timeout_match = 0
+        self.time_left = None
+        self.board_lines = None  # Stones received after BOARD, until DONE
+
+        self.commands = {
+            'START': self.start,
+            'RESTART': self.restart,
+            'BEGIN': self.begin,
+            'TURN': self.turn,
+            'BOARD': self.board,
+            'TAKEBACK': self.takeback,
+            'INFO': self.info,
+            'ABOUT': self.about,
+        }
+
+    def send(self, line):
+        self.output.write(line + "\n")
+        self.output.flush()
+
+    def handle(self, line):
+        """Handle one input line; returns False on END"""
+        line = line.strip()
+        if not line:
+            return True
+
+        if self.board_lines is not None:
+            self.board_stone(line)
+            return True
+
+        command, _, argument = line.partition(' ')
+        command = command.upper()
+        if command == 'END':
+            self.close()
+            return False
+
+        handler = self.commands.get(command)
+        if handler is None:
+            self.send(f"UNKNOWN {command}")
+        elif command not in ('START', 'INFO', 'ABOUT') and self.game is None:
+            self.send("ERROR no game started")
+        else:
+            handler(argument.strip())
+        return True
+
+    def start(self, argument):
+        """START [size]: prepare an empty board"""
+        try:
+            size = int(argument)
+        except ValueError:
+            self.send(f"ERROR invalid board size {argument}")
+            return
+        if size < 5:
+            self.send(f"ERROR unsupported board size {size}")
+            return
+
+        if self.game is None or self.game.board_size != size:
+            self.close()
+            self.game = GomokuGame(size)
+            self.ai = GomokuAI(self.game, **self.ai_config)
+        else:
+            self.game.reset_game()
+        self.send("OK")
+
+    def restart(self, argument):
+        """RESTART: new game on the same board, keeping the AI's tables"""
+        self.game.reset_game()
+        self.send("OK")
+
+    def begin(self, argument):
+        """BEGIN: the engine plays the first move"""
+        self.play()
+
+    def turn(self, argument):
+        """TURN x,y: the opponent's move, answered with ours"""
+        move = self.parse_move(argument)
+        if move is None or not self.game.make_move(*move):
+            self.send(f"ERROR invalid move {argument}")
+            return
+        self.play()
+
+    def board(self, argument):
+        """BOARD: a whole position follows as x,y,who lines up to DONE, then the engine moves"""
+        self.board_lines = []
+
+    def board_stone(self, line):
+        if line.upper() != 'DONE':
+            self.board_lines.append(line)
+            return
+
+        own, opponent = [], []
+        for stone in self.board_lines:
+            fields = stone.split(',')
+            move = self.parse_move(','.join(fields[:2]))
+            if move is None or len(fields) != 3:
+                self.send(f"ERROR invalid stone {stone}")
+                self.board_lines = None
+                return
+            # 1 is our stone, 2 the opponent's, 3 a winning-line stone of a continuous game (taken as ours)
+            (opponent if fields[2].strip() == '2' else own).append(move)
+        self.board_lines = None
+
+        # It is our turn, so we are black when both sides have as many stones; replay them alternately
+        black, white = (own, opponent) if len(own) == len(opponent) else (opponent, own)
+        if len(black) - len(white) not in (0, 1):
+            self.send("ERROR stone counts do not allow our turn")
+            return
+
+        self.game.reset_game()
+        for row, col, _ in _alternate_stones(black, white):
+            if not self.game.make_move(row, col):
+                self.send(f"ERROR invalid position at {col},{row}")
+                return
+        self.play()
+
+    def takeback(self, argument):
+        """TAKEBACK x,y: undo the last move, which must be at x,y"""
+        move = self.parse_move(argument)
+        if not self.game.move_history or move != self.game.move_history[-1][:2]:
+            self.send(f"ERROR cannot take back {argument}")
+            return
+        self.game.undo_move()
+        self.send("OK")
+
+    def info(self, argument):
+        """INFO key value: time limits are used, other keys are accepted and ignored"""
+        key, _, value = argument.partition(' ')
+        try:
+            value = int(value)
+        except ValueError:
+            return
+
+        if key == 'timeout_turn':
+            self.timeout_turn = value
+        elif key == 'timeout_match':
+            self.timeout_match = value
+        elif key == 'time_left':
+            self.time_left = value
+
+    def about(self, argument):
+        self.send(ABOUT)
+
+    def think_ms(self):
+        """Search time for this move, including the threat search, leaving a margin for the protocol"""
+        if self.timeout_turn <= 0:
+            return MIN_THINK_MS
+
+        budget = self.timeout_turn
+        if self.timeout_match > 0 and self.time_left is not None:
+            # Spread the remaining match time over the moves still likely to be played
+            empty_cells = self.game.board_size * self.game.board_size - self.game.stone_count
+            budget = min(budget, self.time_left // max(10, min(40, empty_cells // 2)))
+        return max(MIN_THINK_MS, budget - max(150, budget // 5))
+
+    def play(self):
+        """Search, play and send the engine's move"""
+        if self.game.game_over:
+            self.send("ERROR game is over")
+            return
+
+        start = time.perf_counter()
+        self.ai.think_ms = self.think_ms()
+        move = self.ai.get_best_move()
+        if move is None:
+            self.send("ERROR no move available")
+            return
+
+        row, col = move
+        self.game.make_move(row, col)
+        elapsed = (time.perf_counter() - start) * 1000
+        self.send(f"MESSAGE depth {self.ai.completed_depth} score {self.ai.last_score} time {elapsed:.0f}ms")
+        self.send(f"{col},{row}")
+
+    def parse_move(self, text):
+        """(row, col) of an 'x,y' protocol move, or None if it is not on the board"""
+        try:
+            x, y = (int(value) for value in text.split(','))
+        except ValueError:
+            return None
+        if not (0 <= x < self.game.board_size and 0 <= y < self.game.board_size):
+            return None
+        return y, x
+
+    def close(self):
+        if self.ai is not None:
+            self.ai.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gomoku engine for Gomocup/piskvork managers over stdin and stdout")
+    parser.add_argument('--ai', default='', help="GomokuAI arguments, e.g. 'top_k=12,search=pvs'")
+    args = parser.parse_args()
+
+    engine = GomocupEngine(sys.stdout, parse_config(args.ai))
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,46 @@
+import math
+import multiprocessing
 import numpy as np
 import os
+import random
+import struct
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
 import tkinter as tk
 from tkinter import messagebox, Frame, Button, Label, StringVar, IntVar, Radiobutton
 
 
 class GomokuGame:
-    def __init__(self, board_size=15):
+    sparse = False  # Whether per-position tables would be too large for this board
+
+    def __init__(self, board_size=15, move_radius=1):
         self.board_size = board_size
-        self.board = np.zeros((board_size, board_size), dtype=int)
+        self.move_radius = move_radius  # Candidate moves are empty positions this close to a stone
+        self._clear_stones()
         self.current_player = 1  # 1 represents black stones, 2 represents white stones
         self.game_over = False
         self.winner = None
+        self.patterns = PatternTracker(board_size)
+        self.distance_field = DistanceField(board_size)
+        self.zobrist = ZobristKeys.for_size(board_size)
+        self.hash = 0  # Zobrist hash of the board and the side to move
+        self.move_history = []  # (row, col, player) of every move, for undo_move
+        self.stone_count = 0
+        self.frontier = MoveFrontier(board_size, move_radius)
 
     def reset_game(self):
         """Reset the game"""
-        self.board = np.zeros((self.board_size, self.board_size), dtype=int)
+        self._clear_stones()
         self.current_player = 1
         self.game_over = False
         self.winner = None
+        self.patterns = PatternTracker(self.board_size)
+        self.distance_field = DistanceField(self.board_size)
+        self.hash = 0
+        self.move_history = []
+        self.stone_count = 0
+        self.frontier = MoveFrontier(self.board_size, self.move_radius)
 
     def make_move(self, row, col):
         """Place a stone at the specified position"""
@@ -28,25 +50,105 @@ class GomokuGame:
         if not (0 <= row < self.board_size and 0 <= col < self.board_size):
             return False
 
-        if self.board[row, col] != 0:
+        if not self.is_empty(row, col):
             return False
 
-        self.board[row, col] = self.current_player
+        self._place(row, col, self.current_player)
 
         # Check if the game is over
         if self.check_win(row, col):
             self.game_over = True
             self.winner = self.current_player
-        elif np.all(self.board != 0):  # Check for a draw
+        elif self.stone_count == self.board_size * self.board_size:  # Check for a draw
             self.game_over = True
 
         # Switch player
         self.current_player = 3 - self.current_player  # 1->2, 2->1
         return True
 
+    def _place(self, row, col, player):
+        """Put a stone on the board and update every tracker, without checking the rules"""
+        self._put_stone(row, col, player)
+        self.patterns.place(row, col, player)
+        self.distance_field.place(row, col, player)
+        self.hash ^= self.zobrist.stones[player][row * self.board_size + col] ^ self.zobrist.side
+        self.move_history.append((row, col, player))
+        self.stone_count += 1
+        self.frontier.place(row, col)
+
+    @property
+    def board(self):
+        """The board as an array; assigning to it sets up the position with set_board"""
+        return self._board
+
+    @board.setter
+    def board(self, board):
+        self.set_board(board)
+
+    def set_board(self, board, current_player=None):
+        """Set up the position of a board array, rebuilding every tracker
+
+        The stones go into move_history alternately, black first, as far as the stone counts allow,
+        so undo_move takes them back one by one. current_player defaults to the side to move now.
+        """
+        board = np.asarray(board)
+        if board.shape != (self.board_size, self.board_size):
+            raise ValueError(f"Board of shape {board.shape} does not fit a {self.board_size}x{self.board_size} game")
+        if current_player is None:
+            current_player = self.current_player
+
+        black, white = ([(int(row), int(col)) for row, col in zip(*np.nonzero(board == player))] for player in (1, 2))
+        self.reset_game()
+        for row, col, player in _alternate_stones(black, white):
+            self._place(row, col, player)
+            if self.winner is None and self.check_win(row, col):
+                self.game_over = True
+                self.winner = player
+
+        if self.stone_count == self.board_size * self.board_size:
+            self.game_over = True
+        # The hash has the side to move of an alternating game; flip it if another side is to move
+        if current_player != self.stone_count % 2 + 1:
+            self.hash ^= self.zobrist.side
+        self.current_player = current_player
+
+    def undo_move(self):
+        """Take back the last move"""
+        if not self.move_history:
+            return False
+
+        row, col, player = self.move_history.pop()
+
+        self._remove_stone(row, col)
+        self.patterns.remove(row, col, player)
+        self.distance_field.remove(row, col, player)
+        self.hash ^= self.zobrist.stones[player][row * self.board_size + col] ^ self.zobrist.side
+        self.stone_count -= 1
+        self.frontier.remove(row, col)
+
+        # A move can only be made while the game is running
+        self.current_player = player
+        self.game_over = False
+        self.winner = None
+        return True
+
+    def is_empty(self, row, col):
+        """Check if the position has no stone on it"""
+        return self._board[row, col] == 0
+
+    def _clear_stones(self):
+        self._board = np.zeros((self.board_size, self.board_size), dtype=int)
+
+    def _put_stone(self, row, col, player):
+        self._board[row, col] = player
+
+    def _remove_stone(self, row, col):
+        self._board[row, col] = 0
+
     def check_win(self, row, col):
         """Check if there are five consecutive stones from the last move"""
-        player = self.board[row, col]
+        board = self._board
+        player = board[row, col]
         directions = [
             (0, 1),  # horizontal
             (1, 0),  # vertical
@@ -60,14 +162,14 @@ class GomokuGame:
             # Check one direction
             for i in range(1, 5):
                 r, c = row + dr * i, col + dc * i
-                if not (0 <= r < self.board_size and 0 <= c < self.board_size) or self.board[r, c] != player:
+                if not (0 <= r < self.board_size and 0 <= c < self.board_size) or board[r, c] != player:
                     break
                 count += 1
 
             # Check the opposite direction
             for i in range(1, 5):
                 r, c = row - dr * i, col - dc * i
-                if not (0 <= r < self.board_size and 0 <= c < self.board_size) or self.board[r, c] != player:
+                if not (0 <= r < self.board_size and 0 <= c < self.board_size) or board[r, c] != player:
                     break
                 count += 1
 
@@ -113,122 +215,331 @@ class GomokuGame:
 
     def get_valid_moves(self):
         """Get all valid move positions"""
-        valid_moves = []
-
         # Optimization: only consider empty positions around existing stones
-        if np.any(self.board != 0):  # If there are stones on the board
-            for i in range(self.board_size):
-                for j in range(self.board_size):
-                    if self.board[i, j] == 0:  # Empty position
-                        # Check if there are stones in 8 directions
-                        has_neighbor = False
-                        for di in [-1, 0, 1]:
-                            for dj in [-1, 0, 1]:
-                                if di == 0 and dj == 0:
-                                    continue
-                                ni, nj = i + di, j + dj
-                                if 0 <= ni < self.board_size and 0 <= nj < self.board_size and self.board[ni, nj] != 0:
-                                    has_neighbor = True
-                                    break
-                            if has_neighbor:
-                                break
-
-                        if has_neighbor:
-                            valid_moves.append((i, j))
-        else:  # If the board is empty, return the center position
-            valid_moves.append((self.board_size // 2, self.board_size // 2))
-
-        return valid_moves
+        if self.stone_count:
+            return self.frontier.moves()
+
+        # If the board is empty, return the center position
+        return [(self.board_size // 2, self.board_size // 2)]
+
+
+class BitboardGomokuGame(GomokuGame):
+    """GomokuGame that stores each player's stones as a big-int bitboard
+
+    Cell (row, col) is bit row * (board_size + 1) + col. The extra guard column is always
+    empty, so shifting a bitboard never carries a stone from one row into the next. Candidate
+    moves come from the MoveFrontier every backend maintains, which is cheaper than a bitboard scan.
+    """
+
+    def __init__(self, board_size=15, move_radius=1):
+        self.width = board_size + 1
+        # Bit distance between neighbours: horizontal, vertical, diagonal, anti-diagonal
+        self.shifts = (1, self.width, self.width + 1, self.width - 1)
+        super().__init__(board_size, move_radius)
+
+    @property
+    def board(self):
+        """NumPy copy of the bitboards, rebuilt only after the position changes"""
+        if self._board_cache is None:
+            size, width = self.board_size, self.width
+            n_bytes = (size * width + 7) // 8
+            board = np.zeros(size * width, dtype=int)
+            for player in (1, 2):
+                bits = np.unpackbits(np.frombuffer(self.stones[player].to_bytes(n_bytes, 'little'), dtype=np.uint8),
+                                     bitorder='little')
+                board[bits[:size * width] == 1] = player
+            self._board_cache = board.reshape(size, width)[:, :size]
+        return self._board_cache
+
+    @board.setter
+    def board(self, board):
+        self.set_board(board)
+
+    def _clear_stones(self):
+        self.stones = [0, 0, 0]  # Bitboard per player (index 0 unused)
+        self._board_cache = None
+
+    def is_empty(self, row, col):
+        """Check if the position has no stone on it"""
+        return not ((self.stones[1] | self.stones[2]) >> (row * self.width + col)) & 1
+
+    def _put_stone(self, row, col, player):
+        self.stones[player] |= 1 << (row * self.width + col)
+        self._board_cache = None
+
+    def _remove_stone(self, row, col):
+        mask = ~(1 << (row * self.width + col))
+        self.stones[1] &= mask
+        self.stones[2] &= mask
+        self._board_cache = None
 
+    def check_win(self, row, col):
+        """Check if there are five consecutive stones through the last move"""
+        bit = 1 << (row * self.width + col)
+        stones = self.stones[1] if self.stones[1] & bit else self.stones[2]
+
+        for shift in self.shifts:
+            # Bits that start a run of five
+            runs = stones & (stones >> shift)
+            runs &= runs >> (2 * shift)
+            runs &= stones >> (4 * shift)
+
+            # Only runs that contain the last move count
+            if runs & (bit | bit >> shift | bit >> (2 * shift) | bit >> (3 * shift) | bit >> (4 * shift)):
+                return True
 
-class GomokuAI:
-    def __init__(self, game, max_depth=3):
-        self.game = game
-        self.max_depth = max_depth
+        return False
 
-    def _calculate_separation(self, board, whose_turn):
-        opponent = 3 - whose_turn
-        size = len(board)
 
-        my_pieces = []
-        opponent_pieces = []
+class SparseGomokuGame(GomokuGame):
+    """GomokuGame that keeps only the stones, for boards too large for per-position arrays
 
-        for i in range(size):
-            for j in range(size):
-                if board[i, j] == whose_turn:
-                    my_pieces.append((i, j))
-                elif board[i, j] == opponent:
-                    opponent_pieces.append((i, j))
+    Stones are kept in a dict keyed by flat index along with their bounding box, and every
+    tracker works from the stones, so a move, a move generation or an evaluation costs the
+    same on any board size. board_size=None gives a board UNBOUNDED positions wide, which a
+    game never gets near the edge of; play starts at its center as usual.
+    """
 
-        if not my_pieces or not opponent_pieces:
-            return 0
+    sparse = True
+    UNBOUNDED = 1 << 20
+    MAX_DENSE_SIZE = 1024  # Largest board the board array is built for
 
-        total_min_distance = 0
-        for my_i, my_j in my_pieces:
-            min_distance = float('inf')
-            for opp_i, opp_j in opponent_pieces:
-                distance = abs(my_i - opp_i) + abs(my_j - opp_j)
-                min_distance = min(min_distance, distance)
+    def __init__(self, board_size=15, move_radius=1):
+        self.board_size = self.UNBOUNDED if board_size is None else board_size
+        self.move_radius = move_radius
+        self.zobrist = SparseZobristKeys()
+        self.reset_game()
 
-            total_min_distance += min_distance
+    def reset_game(self):
+        """Reset the game"""
+        self.stone_map = {}  # Flat index -> player
+        self.bounds = None  # (min_row, min_col, max_row, max_col) of the stones, None while the board is empty
+        self._bounds_history = []
+        self._board_cache = None
+        self.current_player = 1
+        self.game_over = False
+        self.winner = None
+        self.patterns = SparsePatternTracker(self.board_size)
+        self.distance_field = SparseDistanceField(self.board_size)
+        self.hash = 0
+        self.move_history = []
+        self.stone_count = 0
+        self.frontier = SparseMoveFrontier(self.board_size, self.move_radius)
+
+    @property
+    def board(self):
+        """NumPy copy of the board, built on demand; only available up to MAX_DENSE_SIZE"""
+        if self.board_size > self.MAX_DENSE_SIZE:
+            raise ValueError(f"A {self.board_size}x{self.board_size} board has no dense array; use stone_map")
+
+        if self._board_cache is None:
+            board = np.zeros(self.board_size * self.board_size, dtype=int)
+            for index, player in self.stone_map.items():
+                board[index] = player
+            self._board_cache = board.reshape(self.board_size, self.board_size)
+        return self._board_cache
+
+    @board.setter
+    def board(self, board):
+        self.set_board(board)
+
+    def is_empty(self, row, col):
+        """Check if the position has no stone on it"""
+        return row * self.board_size + col not in self.stone_map
+
+    def _put_stone(self, row, col, player):
+        self.stone_map[row * self.board_size + col] = player
+        self._bounds_history.append(self.bounds)
+        if self.bounds is None:
+            self.bounds = (row, col, row, col)
+        else:
+            min_row, min_col, max_row, max_col = self.bounds
+            self.bounds = (min(min_row, row), min(min_col, col), max(max_row, row), max(max_col, col))
+        self._board_cache = None
 
-        separation_score = total_min_distance / len(my_pieces)
+    def _remove_stone(self, row, col):
+        del self.stone_map[row * self.board_size + col]
+        self.bounds = self._bounds_history.pop()
+        self._board_cache = None
 
-        return separation_score * 10
+    def check_win(self, row, col):
+        """Check if there are five consecutive stones through the last move"""
+        size, stone_map = self.board_size, self.stone_map
+        player = stone_map[row * size + col]
+
+        for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            count = 1
+            for sign in (1, -1):
+                for i in range(1, 5):
+                    r, c = row + sign * dr * i, col + sign * dc * i
+                    if not (0 <= r < size and 0 <= c < size) or stone_map.get(r * size + c) != player:
+                        break
+                    count += 1
 
-    def evaluate_board(self, whose_turn, board):
+            if count >= 5:
+                return True
 
-        opponent = 3 - whose_turn  # 1->2, 2->1
-
-        # Pattern scores
-        pattern_scores = {
-            5: 100000,  # Five in a row (victory)
-            'open_four': 10000,  # Open four
-            'half_four': 1000,  # Half-blocked four
-            'jump_four': 800,  # Jump four (slightly weaker than half-blocked four)
-            'open_three': 500,  # Open three
-            'jump_three': 300,  # Jump three (weaker than open three)
-            'half_three': 100,  # Half-blocked three
-            'open_two': 50,  # Open two
-            'half_two': 10  # Half-blocked two
-        }
+        return False
 
-        my_score = 0
-        opponent_score = 0
+    def display_board(self):
+        """Display the region around the stones"""
+        if self.board_size <= 36:
+            super().display_board()
+            return
 
-        # Check all rows, columns, and diagonals
-        directions = [(0, 1), (1, 0), (1, 1), (1, -1)]
-        size = len(board)
+        os.system('cls' if os.name == 'nt' else 'clear')
+        center = self.board_size // 2
+        min_row, min_col, max_row, max_col = self.bounds or (center, center, center, center)
+        rows = range(max(0, min_row - 2), min(self.board_size, max_row + 3))
+        cols = range(max(0, min_col - 2), min(self.board_size, max_col + 3))
+        marks = {0: ". ", 1: "○ ", 2: "● "}
 
-        # Check each direction
-        for start_i in range(size):
-            for start_j in range(size):
-                for di, dj in directions:
-                    # Skip starting points that would go out of bounds
-                    end_i, end_j = start_i + 4 * di, start_j + 4 * dj
-                    if not (0 <= end_i < size and 0 <= end_j < size):
-                        continue
+        print(f"Columns {cols.start}-{cols.stop - 1}")
+        for i in rows:
+            print(f"{i:>8} " + "".join(marks[self.stone_map.get(i * self.board_size + j, 0)] for j in cols))
+
+        player_name = "Black(○)" if self.current_player == 1 else "White(●)"
+        print(f"\nCurrent Player: {player_name}")
 
-                    # Extract the stones on this line
-                    line = []
-                    for step in range(5):
-                        i, j = start_i + step * di, start_j + step * dj
-                        line.append(board[i, j])
+        if self.game_over:
+            if self.winner:
+                winner_name = "Black(○)" if self.winner == 1 else "White(●)"
+                print(f"Game Over! {winner_name} wins!")
+            else:
+                print("Game Over! It's a draw!")
 
-                    # Check my patterns
-                    my_pattern = self._check_pattern(line, whose_turn)
-                    if my_pattern in pattern_scores:
-                        my_score += pattern_scores[my_pattern]
 
-                    # Check opponent's patterns
-                    opponent_pattern = self._check_pattern(line, opponent)
-                    if opponent_pattern in pattern_scores:
-                        opponent_score += pattern_scores[opponent_pattern]
+class _LazyTable(dict):
+    """Dict that computes a missing entry from its key on first access and keeps it"""
 
-        # return my_score - opponent_score
+    def __init__(self, compute):
+        super().__init__()
+        self.compute = compute
 
-        separation_score = self._calculate_separation(board, whose_turn)
+    def __missing__(self, key):
+        value = self[key] = self.compute(key)
+        return value
 
+
+# Pattern scores
+PATTERN_SCORES = {
+    5: 100000,  # Five in a row (victory)
+    'open_four': 10000,  # Open four
+    'half_four': 1000,  # Half-blocked four
+    'jump_four': 800,  # Jump four (slightly weaker than half-blocked four)
+    'open_three': 500,  # Open three
+    'jump_three': 300,  # Jump three (weaker than open three)
+    'half_three': 100,  # Half-blocked three
+    'open_two': 50,  # Open two
+    'half_two': 10  # Half-blocked two
+}
+
+
+class GomokuAI:
+    def __init__(self, game, max_depth=3, tt_capacity=1 << 18, tt_replacement='depth', move_ordering=True,
+                 top_k=None, think_ms=None, workers=1, batch_leaves=False, threat_search=True, threat_budget=2000,
+                 book=None, collect_stats=False, on_progress=None, ponder_width=3, search='alphabeta',
+                 aspiration_window=200, quiescence=False, quiescence_depth=4, quiescence_nodes=32):
+        if search not in ('alphabeta', 'pvs'):
+            raise ValueError(f"Unknown search algorithm: {search}")
+
+        self.game = game
+        self.max_depth = max_depth
+        # 'alphabeta' searches with minimax, 'pvs' with negamax principal variation search
+        self.search = search
+        # Half-width of the window around the previous depth's score in iterative deepening with 'pvs'
+        self.aspiration_window = aspiration_window
+        # Time budget per move; when set, get_best_move deepens 1, 2, 3... instead of searching max_depth
+        self.think_ms = think_ms
+        self.completed_depth = 0  # Depth of the last search that finished
+        self.last_score = None  # Score behind the last move, None if it did not come from a search or the book
+        self._deadline = None
+        self.stop_requested = False  # Set by stop() from another thread to end the running search
+
+        # Opening book (an OpeningBook or the path of a book file) consulted before any search
+        self.book = OpeningBook(book) if isinstance(book, (str, os.PathLike)) else book
+        # Transposition table shared by all searches of this AI (None disables it)
+        self.tt_capacity = tt_capacity
+        self.tt_replacement = tt_replacement
+        self.tt = TranspositionTable(tt_capacity, tt_replacement) if tt_capacity else None
+
+        # Parallel root search: root moves are split across a pool of worker processes kept between moves
+        self.workers = workers
+        self._pool = None
+        self._shared_alpha = None  # [search id, best root score so far], shared with the workers
+        self._search_id = 0
+
+        # Look for forced wins and required defences with a ThreatSolver before the regular search
+        self.threat_search = threat_search
+        self.threat_budget = threat_budget
+
+        # Score the leaves below each depth-1 node with one BoardEvaluator call instead of one by one.
+        # The evaluator needs the dense board array, so sparse boards always score leaves one by one.
+        self.batch_leaves = batch_leaves and not game.sparse
+
+        # Quiescence: extend the leaves with forcing replies only (blocks of fives, answers to open threes)
+        # and score decided threats directly, up to quiescence_depth plies and quiescence_nodes nodes per leaf
+        self.quiescence = quiescence
+        self.quiescence_depth = quiescence_depth
+        self.quiescence_nodes = quiescence_nodes
+        self._quiescence_solver = ThreatSolver(game)
+        self._quiescence_left = 0  # Nodes left for the leaf being extended
+
+        # Move ordering
+        self.move_ordering = move_ordering
+        self.top_k = top_k  # Only search the top_k best-ordered moves at each node (None searches all)
+        self.killers = {}  # Depth -> up to two recent moves that caused a cutoff at that depth
+        # Cutoff history per player and position, kept across moves; a dict on sparse boards
+        if game.sparse:
+            self.history = [None, _LazyTable(lambda index: 0), _LazyTable(lambda index: 0)]
+        else:
+            cells = game.board_size * game.board_size
+            self.history = [None, [0] * cells, [0] * cells]
+
+        # Search statistics: SearchStats of the last get_best_move call when enabled, None otherwise.
+        # on_progress(stats) is called after each search depth and every few thousand nodes.
+        self.on_progress = on_progress
+        self.collect_stats = collect_stats or on_progress is not None
+        self.stats = None
+        self._depth_stats = None  # DepthStats of the depth being searched
+
+        # Pondering: after its move the AI searches the opponent's ponder_width likeliest replies in a thread,
+        # on its own copy of the game, sharing this AI's transposition table
+        self.ponder_width = ponder_width
+        self._ponder_ai = None
+        self._ponder_thread = None
+        self._ponder_lock = threading.Lock()
+        self._ponder_root = None  # Moves of the position the pondering started from
+        self._ponder_results = {}  # Reply -> (best move, score, completed depth)
+        self._ponder_current = None  # Reply being searched
+        self._ponder_stop = False
+        self._ponder_finish = False  # Stop after the reply being searched
+
+    def _calculate_separation(self, board, whose_turn):
+        """Average distance from each of whose_turn's stones to the nearest opponent stone, times 10"""
+        board = np.asarray(board)
+        return float(BoardEvaluator.for_size(len(board)).separation(board[np.newaxis], whose_turn)[0])
+
+    def evaluate_board(self, whose_turn, board):
+        """Evaluate any board from whose_turn's point of view"""
+        return float(self.evaluate_boards(whose_turn, np.asarray(board)[np.newaxis])[0])
+
+    def evaluate_boards(self, whose_turn, boards):
+        """Evaluate a stack of boards of shape (count, size, size) in one pass"""
+        boards = np.asarray(boards)
+        return BoardEvaluator.for_size(boards.shape[-1]).evaluate(boards, whose_turn)
+
+    def evaluate_position(self, whose_turn):
+        """Evaluate the game's current position using the incrementally maintained pattern scores"""
+        my_score = self.game.patterns.scores[whose_turn]
+        opponent_score = self.game.patterns.scores[3 - whose_turn]
+
+        separation_score = self.game.distance_field.separation(whose_turn)
+
+        return self._combine_scores(my_score, opponent_score, separation_score)
+
+    @staticmethod
+    def _combine_scores(my_score, opponent_score, separation_score):
         score_diff = my_score - opponent_score
 
         # If current player gets a higher score, increase the separation
@@ -239,7 +550,8 @@ class GomokuAI:
 
         return final_score
 
-    def _check_pattern(self, line, player):
+    @staticmethod
+    def _check_pattern(line, player):
 
         # Normal
         if line.count(player) == 5:
@@ -276,32 +588,86 @@ class GomokuAI:
         return 0
 
     def minimax(self, depth, alpha, beta, is_maximizing):
+        if self.stop_requested or (self._deadline is not None and time.perf_counter() > self._deadline):
+            raise SearchTimeout
+
+        stats = self._depth_stats
+        if stats is not None:
+            stats.nodes += 1
+            if self.on_progress is not None and stats.nodes & 4095 == 0:
+                self.on_progress(self.stats)
+
+        # Leaves are always scored for the maximizing side, so scores stay comparable across depths
+        maximizing_player = self.game.current_player if is_maximizing else 3 - self.game.current_player
 
         if self.game.game_over or depth == 0:
-            return self.evaluate_board(self.game.current_player, self.game.board), None
+            if stats is None:
+                return self._leaf_score(alpha, beta, is_maximizing, maximizing_player), None
+            start = time.perf_counter()
+            score = self._leaf_score(alpha, beta, is_maximizing, maximizing_player)
+            stats.evaluate_seconds += time.perf_counter() - start
+            stats.leaves += 1
+            return score, None
+
+        # Probe the transposition table
+        tt_move = None
+        if self.tt is not None:
+            tt_key = self.game.hash ^ self.game.zobrist.perspective[maximizing_player]
+            entry = self.tt.probe(tt_key)
+            if entry is not None:
+                entry_depth, entry_score, entry_flag, tt_move = entry
+                if entry_depth >= depth:
+                    if entry_flag == TranspositionTable.EXACT:
+                        return entry_score, tt_move
+                    if entry_flag == TranspositionTable.LOWER_BOUND:
+                        alpha = max(alpha, entry_score)
+                    else:
+                        beta = min(beta, entry_score)
+                    if beta <= alpha:
+                        return entry_score, tt_move
+
+        if stats is not None:
+            start = time.perf_counter()
 
         valid_moves = self.game.get_valid_moves()
 
         if not valid_moves:
             return 0, None
 
-        best_move = None
-
-        if is_maximizing:
-            max_eval = float('-inf')
-            for row, col in valid_moves:
+        if self.move_ordering:
+            valid_moves = self._order_moves(valid_moves, depth, tt_move)
+        elif tt_move in valid_moves:  # Search the stored best move first
+            valid_moves.remove(tt_move)
+            valid_moves.insert(0, tt_move)
 
-                board_copy = np.copy(self.game.board)
-                current_player = self.game.current_player
+        if stats is not None:
+            stats.move_gen_seconds += time.perf_counter() - start
+            stats.interior_nodes += 1
 
-                self.game.make_move(row, col)
+        alpha_orig, beta_orig = alpha, beta
+        best_move = None
 
-                eval_score, _ = self.minimax(depth - 1, alpha, beta, False)
+        # Children of depth-1 nodes are leaves: score them all in one batch
+        leaf_scores = None
+        if depth == 1 and self.batch_leaves and not self.quiescence:
+            if stats is not None:
+                start = time.perf_counter()
+            leaf_scores = self._evaluate_children(valid_moves, maximizing_player)
+            if stats is not None:
+                stats.evaluate_seconds += time.perf_counter() - start
+                stats.leaves += len(valid_moves)
 
-                self.game.board = board_copy
-                self.game.current_player = current_player
-                self.game.game_over = False
-                self.game.winner = None
+        if is_maximizing:
+            max_eval = float('-inf')
+            for index, (row, col) in enumerate(valid_moves):
+                if leaf_scores is not None:
+                    eval_score = leaf_scores[index]
+                elif stats is None:
+                    self.game.make_move(row, col)
+                    eval_score, _ = self.minimax(depth - 1, alpha, beta, False)
+                    self.game.undo_move()
+                else:
+                    eval_score = self._timed_child(row, col, depth - 1, alpha, beta, False, stats)
 
                 if eval_score > max_eval:
                     max_eval = eval_score
@@ -309,24 +675,24 @@ class GomokuAI:
 
                 alpha = max(alpha, eval_score)
                 if beta <= alpha:
+                    self._record_cutoff(row, col, depth)
+                    if stats is not None:
+                        stats.cutoffs += 1
+                        stats.first_move_cutoffs += index == 0
                     break
 
-            return max_eval, best_move
+            best_score = max_eval
         else:
             min_eval = float('inf')
-            for row, col in valid_moves:
-
-                board_copy = np.copy(self.game.board)
-                current_player = self.game.current_player
-
-                self.game.make_move(row, col)
-
-                eval_score, _ = self.minimax(depth - 1, alpha, beta, True)
-
-                self.game.board = board_copy
-                self.game.current_player = current_player
-                self.game.game_over = False
-                self.game.winner = None
+            for index, (row, col) in enumerate(valid_moves):
+                if leaf_scores is not None:
+                    eval_score = leaf_scores[index]
+                elif stats is None:
+                    self.game.make_move(row, col)
+                    eval_score, _ = self.minimax(depth - 1, alpha, beta, True)
+                    self.game.undo_move()
+                else:
+                    eval_score = self._timed_child(row, col, depth - 1, alpha, beta, True, stats)
 
                 if eval_score < min_eval:
                     min_eval = eval_score
@@ -334,15 +700,1885 @@ class GomokuAI:
 
                 beta = min(beta, eval_score)
                 if beta <= alpha:
+                    self._record_cutoff(row, col, depth)
+                    if stats is not None:
+                        stats.cutoffs += 1
+                        stats.first_move_cutoffs += index == 0
                     break
 
-            return min_eval, best_move
+            best_score = min_eval
+
+        if stats is not None:
+            stats.children += index + 1
+
+        # Store the result along with how it relates to the search window
+        if self.tt is not None:
+            if best_score <= alpha_orig:
+                flag = TranspositionTable.UPPER_BOUND
+            elif best_score >= beta_orig:
+                flag = TranspositionTable.LOWER_BOUND
+            else:
+                flag = TranspositionTable.EXACT
+            self.tt.store(tt_key, depth, best_score, flag, best_move)
+
+        return best_score, best_move
+
+    def _leaf_score(self, alpha, beta, is_maximizing, maximizing_player):
+        """Score of a search leaf for maximizing_player, extended by the quiescence search when enabled"""
+        if not self.quiescence or self.game.game_over:
+            return self.evaluate_position(maximizing_player)
+        self._quiescence_left = self.quiescence_nodes
+        return self._quiescence(self.quiescence_depth, alpha, beta, is_maximizing, maximizing_player)
+
+    def _quiescence(self, depth, alpha, beta, is_maximizing, maximizing_player):
+        """Alpha-beta over forcing moves only, so that a leaf is not scored in the middle of a tactic
+
+        Threats that decide the game are scored without playing them out: a five for the side to
+        move, two fives for the opponent, or an open or double four for the side to move while the
+        opponent has no five to make. Otherwise the side to move has to block the opponent's five
+        or answer its open three, and in a quiet position it stands pat on the static evaluation.
+        """
+        self._quiescence_left -= 1
+        if self._depth_stats is not None:
+            self._depth_stats.quiescence_nodes += 1
+
+        if self.game.game_over:
+            return self.evaluate_position(maximizing_player)
+
+        solver = self._quiescence_solver
+        me = self.game.current_player
+        opponent = 3 - me
+        win = PATTERN_SCORES[5] if me == maximizing_player else -PATTERN_SCORES[5]
+
+        if solver.five_moves(me):
+            return win
+        moves = solver.five_moves(opponent)
+        if len(moves) > 1:
+            return -win
+        if not moves and solver.has_double_four_move(me):
+            return win
+
+        if depth == 0 or self._quiescence_left <= 0:
+            return self.evaluate_position(maximizing_player)
+
+        if not moves:
+            threats = solver.double_four_moves(opponent)
+            if not threats:
+                return self.evaluate_position(maximizing_player)
+            moves = solver.blocking_moves(opponent, threats)
+
+        best_score = float('-inf') if is_maximizing else float('inf')
+
+        size = self.game.board_size
+        for index in sorted(moves):
+            self.game.make_move(*divmod(index, size))
+            score = self._quiescence(depth - 1, alpha, beta, not is_maximizing, maximizing_player)
+            self.game.undo_move()
+
+            if is_maximizing:
+                best_score = max(best_score, score)
+                alpha = max(alpha, score)
+            else:
+                best_score = min(best_score, score)
+                beta = min(beta, score)
+            if beta <= alpha or self._quiescence_left <= 0:
+                break
+
+        return best_score
+
+    def negamax(self, depth, alpha, beta, color):
+        """Principal variation search in negamax form, scoring positions for the side to move
+
+        color is 1 when the side to move is the root player and -1 otherwise. Leaves are scored for
+        the root player as in minimax, and table entries are shared with it, so both return the same values.
+        """
+        if self.stop_requested or (self._deadline is not None and time.perf_counter() > self._deadline):
+            raise SearchTimeout
+
+        stats = self._depth_stats
+        if stats is not None:
+            stats.nodes += 1
+            if self.on_progress is not None and stats.nodes & 4095 == 0:
+                self.on_progress(self.stats)
+
+        root_player = self.game.current_player if color == 1 else 3 - self.game.current_player
+
+        if self.game.game_over or depth == 0:
+            # The quiescence search works in the root player's scores, like minimax
+            root_alpha, root_beta = (alpha, beta) if color == 1 else (-beta, -alpha)
+            if stats is None:
+                return color * self._leaf_score(root_alpha, root_beta, color == 1, root_player), None
+            start = time.perf_counter()
+            score = self._leaf_score(root_alpha, root_beta, color == 1, root_player)
+            stats.evaluate_seconds += time.perf_counter() - start
+            stats.leaves += 1
+            return color * score, None
+
+        # Probe the transposition table; entries hold the root player's scores, as in minimax
+        tt_move = None
+        if self.tt is not None:
+            tt_key = self.game.hash ^ self.game.zobrist.perspective[root_player]
+            entry = self.tt.probe(tt_key)
+            if entry is not None:
+                entry_depth, entry_score, entry_flag, tt_move = entry
+                if entry_depth >= depth:
+                    entry_score *= color
+                    if entry_flag == TranspositionTable.EXACT:
+                        return entry_score, tt_move
+                    if (entry_flag == TranspositionTable.LOWER_BOUND) == (color == 1):
+                        alpha = max(alpha, entry_score)
+                    else:
+                        beta = min(beta, entry_score)
+                    if beta <= alpha:
+                        return entry_score, tt_move
+
+        if stats is not None:
+            start = time.perf_counter()
+
+        valid_moves = self.game.get_valid_moves()
+
+        if not valid_moves:
+            return 0, None
+
+        if self.move_ordering:
+            valid_moves = self._order_moves(valid_moves, depth, tt_move)
+        elif tt_move in valid_moves:  # Search the stored best move first
+            valid_moves.remove(tt_move)
+            valid_moves.insert(0, tt_move)
+
+        if stats is not None:
+            stats.move_gen_seconds += time.perf_counter() - start
+            stats.interior_nodes += 1
+
+        alpha_orig = alpha
+        best_score = float('-inf')
+        best_move = None
+
+        # Children of depth-1 nodes are leaves: score them all in one batch
+        leaf_scores = None
+        if depth == 1 and self.batch_leaves and not self.quiescence:
+            if stats is not None:
+                start = time.perf_counter()
+            leaf_scores = self._evaluate_children(valid_moves, root_player)
+            if stats is not None:
+                stats.evaluate_seconds += time.perf_counter() - start
+                stats.leaves += len(valid_moves)
+
+        for index, (row, col) in enumerate(valid_moves):
+            if leaf_scores is not None:
+                eval_score = color * leaf_scores[index]
+            else:
+                eval_score = self._negamax_child(row, col, depth - 1, alpha, beta, color, index == 0, stats)
+
+            if eval_score > best_score:
+                best_score = eval_score
+                best_move = (row, col)
+
+            alpha = max(alpha, eval_score)
+            if beta <= alpha:
+                self._record_cutoff(row, col, depth)
+                if stats is not None:
+                    stats.cutoffs += 1
+                    stats.first_move_cutoffs += index == 0
+                break
+
+        if stats is not None:
+            stats.children += index + 1
+
+        # Store the result for the root player, so the bounds swap at the opponent's nodes
+        if self.tt is not None:
+            if best_score <= alpha_orig:
+                flag = TranspositionTable.UPPER_BOUND if color == 1 else TranspositionTable.LOWER_BOUND
+            elif best_score >= beta:
+                flag = TranspositionTable.LOWER_BOUND if color == 1 else TranspositionTable.UPPER_BOUND
+            else:
+                flag = TranspositionTable.EXACT
+            self.tt.store(tt_key, depth, color * best_score, flag, best_move)
+
+        return best_score, best_move
+
+    def _negamax_child(self, row, col, depth, alpha, beta, color, full_window, stats):
+        """Score of a move for the side making it: the first move gets the full window, later ones a null window"""
+        if stats is not None:
+            start = time.perf_counter()
+            self.game.make_move(row, col)
+            stats.make_move_seconds += time.perf_counter() - start
+        else:
+            self.game.make_move(row, col)
+
+        if full_window:
+            score = -self.negamax(depth, -beta, -alpha, -color)[0]
+        else:
+            # Only prove the move is no better than alpha; re-search with the full window if it is
+            score = -self.negamax(depth, -math.nextafter(alpha, math.inf), -alpha, -color)[0]
+            if alpha < score < beta:
+                if stats is not None:
+                    stats.researches += 1
+                score = -self.negamax(depth, -beta, -score, -color)[0]
+
+        if stats is not None:
+            start = time.perf_counter()
+            self.game.undo_move()
+            stats.make_move_seconds += time.perf_counter() - start
+        else:
+            self.game.undo_move()
+
+        return score
+
+    def _timed_child(self, row, col, depth, alpha, beta, is_maximizing, stats):
+        """Search the position after a move, adding the time spent making and taking back the move to stats"""
+        start = time.perf_counter()
+        self.game.make_move(row, col)
+        stats.make_move_seconds += time.perf_counter() - start
+
+        score, _ = self.minimax(depth, alpha, beta, is_maximizing)
+
+        start = time.perf_counter()
+        self.game.undo_move()
+        stats.make_move_seconds += time.perf_counter() - start
+        return score
+
+    def _evaluate_children(self, moves, maximizing_player):
+        """Scores of the positions after each move, evaluated together as one stack of boards"""
+        rows, cols = zip(*moves)
+        boards = np.repeat(self.game.board[np.newaxis], len(moves), axis=0)
+        boards[np.arange(len(moves)), rows, cols] = self.game.current_player
+        return self.evaluate_boards(maximizing_player, boards).tolist()
+
+    def _order_moves(self, moves, depth, tt_move):
+        """Order moves best-first: stored best move, killer moves, then by threat score and history"""
+        player = self.game.current_player
+        size = self.game.board_size
+        threat_score = self.game.patterns.threat_score
+        history = self.history[player]
+
+        ordered = sorted(moves, key=lambda move: (threat_score(move[0], move[1], player),
+                                                  history[move[0] * size + move[1]]), reverse=True)
+
+        first = [tt_move] if tt_move in moves else []
+        for killer in self.killers.get(depth, ()):
+            if killer in moves and killer not in first:
+                first.append(killer)
+        if first:
+            ordered = first + [move for move in ordered if move not in first]
+
+        if self.top_k:
+            ordered = ordered[:self.top_k]
+
+        return ordered
+
+    def _record_cutoff(self, row, col, depth):
+        """Remember a move that caused a beta cutoff"""
+        killers = self.killers.setdefault(depth, [])
+        if (row, col) not in killers:
+            killers.insert(0, (row, col))
+            del killers[2:]
+
+        self.history[self.game.current_player][row * self.game.board_size + col] += depth * depth
 
     def get_best_move(self):
+        # Killer moves only apply to the previous position; history is kept but aged
+        self.killers = {}
+        for player in (1, 2):
+            history = self.history[player]
+            if isinstance(history, dict):
+                for index in history:
+                    history[index] >>= 1
+            else:
+                self.history[player] = [value >> 1 for value in history]
+        self.last_score = None
+        self.completed_depth = 0
+        self.stats = SearchStats() if self.collect_stats else None
+
+        start = time.perf_counter()
+        root_moves = len(self.game.move_history)
+        # The time budget covers the threat search as well as the iterative deepening
+        if self.think_ms is not None:
+            self._deadline = start + self.think_ms / 1000
+        try:
+            best_move = self._select_move()
+        except SearchTimeout:
+            # Stopped during a fixed-depth search: take back the moves of the interrupted search
+            while len(self.game.move_history) > root_moves:
+                self.game.undo_move()
+            raise
+        finally:
+            self.stop_requested = False
+            self._deadline = None
+
+        if self.stats is not None:
+            self.stats.seconds = time.perf_counter() - start
+            if self.on_progress is not None:
+                self.on_progress(self.stats)
+
+        return best_move
 
-        _, best_move = self.minimax(self.max_depth, float('-inf'), float('inf'), True)
+    def stop(self):
+        """Ask the search running in another thread to finish early
+
+        An iterative-deepening search returns the best move of its last completed depth, a fixed-depth
+        search raises SearchTimeout. A stop requested while no search is running ends the next one.
+        """
+        self.stop_requested = True
+
+    def _select_move(self):
+        """Take the move from the pondering, the book, the threat search or the regular search, in that order"""
+        stats = self.stats
+
+        pondered = self._finish_pondering()
+        if pondered is not None:
+            best_move, self.last_score, self.completed_depth = pondered
+            if stats is not None:
+                stats.source = 'ponder'
+            return best_move
+
+        if self.book is not None:
+            book_entry = self.book.lookup(self.game)
+            if book_entry is not None:
+                row, col, self.last_score = book_entry
+                if stats is not None:
+                    stats.source = 'book'
+                return row, col
+
+        if self.threat_search and not self.game.game_over and not self.stop_requested:
+            start = time.perf_counter()
+            threat_move = self._threat_move()
+            if stats is not None:
+                stats.threat_seconds = time.perf_counter() - start
+            if threat_move is not None:
+                if stats is not None:
+                    stats.source = 'threat'
+                return threat_move
+
+        if stats is not None:
+            stats.source = 'search'
+
+        if self.think_ms is not None:
+            return self._iterative_deepening()
+
+        self.last_score, best_move = self._search_root(self.max_depth)
+        self.completed_depth = self.max_depth
         return best_move
 
+    def start_pondering(self):
+        """Search the positions after the opponent's likeliest replies in a background thread
+
+        Call after playing the AI's move. The next get_best_move reuses the result if the opponent
+        played one of the pondered replies, waiting for its search if it is still running.
+        """
+        self.stop_pondering()
+        if self.game.game_over or not self.ponder_width:
+            return
+
+        # The reply the last search expected first, then the best-ordered moves
+        tt_move = None
+        if self.tt is not None:
+            entry = self.tt.probe(self.game.hash ^ self.game.zobrist.perspective[3 - self.game.current_player])
+            if entry is not None:
+                tt_move = entry[3]
+        replies = self._order_moves(self.game.get_valid_moves(), 0, tt_move)[:self.ponder_width]
+
+        if self._ponder_ai is None:
+            game = type(self.game)(self.game.board_size, self.game.move_radius)
+            self._ponder_ai = GomokuAI(game, max_depth=self.max_depth, tt_capacity=0, move_ordering=self.move_ordering,
+                                       top_k=self.top_k, think_ms=self.think_ms, batch_leaves=self.batch_leaves,
+                                       threat_search=self.threat_search, threat_budget=self.threat_budget,
+                                       book=self.book, search=self.search, aspiration_window=self.aspiration_window,
+                                       quiescence=self.quiescence, quiescence_depth=self.quiescence_depth,
+                                       quiescence_nodes=self.quiescence_nodes)
+            self._ponder_ai.tt = self.tt
+
+        self._ponder_root = [(row, col) for row, col, _ in self.game.move_history]
+        self._ponder_results = {}
+        self._ponder_stop = self._ponder_finish = False
+        self._ponder_thread = threading.Thread(target=self._ponder, args=(self._ponder_root, replies), daemon=True)
+        self._ponder_thread.start()
+
+    def stop_pondering(self):
+        """Stop the pondering thread and discard its results"""
+        if self._ponder_thread is not None:
+            with self._ponder_lock:
+                self._ponder_stop = True
+            self._ponder_ai.stop()
+            self._ponder_thread.join()
+            self._ponder_thread = None
+            self._ponder_ai.stop_requested = False  # In case no search was running
+        self._ponder_results = {}
+
+    def _ponder(self, root, replies):
+        """Body of the pondering thread: search each reply the way get_best_move would"""
+        ai = self._ponder_ai
+        for reply in replies:
+            with self._ponder_lock:
+                if self._ponder_stop or self._ponder_finish:
+                    break
+                self._ponder_current = reply
+
+            _sync_game(ai.game, root + [reply])
+            try:
+                best_move = ai.get_best_move()
+            except SearchTimeout:
+                break
+
+            with self._ponder_lock:
+                if self._ponder_stop:  # An iterative-deepening search returns early when stopped
+                    break
+                self._ponder_results[reply] = (best_move, ai.last_score, ai.completed_depth)
+
+        self._ponder_current = None
+
+    def _finish_pondering(self):
+        """End the pondering and return its result for the current position, or None"""
+        if self._ponder_thread is None:
+            return None
+
+        moves = [(row, col) for row, col, _ in self.game.move_history]
+        reply = moves[-1] if moves[:-1] == self._ponder_root else None
+
+        with self._ponder_lock:
+            waiting = reply is not None and reply not in self._ponder_results and reply == self._ponder_current
+            if waiting:
+                self._ponder_finish = True
+
+        if not waiting:
+            result = self._ponder_results.get(reply)
+            self.stop_pondering()
+            return result
+
+        # The opponent played the reply being searched: let that search finish, unless stop() is called meanwhile
+        while self._ponder_thread.is_alive():
+            if self.stop_requested:
+                self.stop_pondering()
+                return None
+            self._ponder_thread.join(0.01)
+        self._ponder_thread = None
+        result = self._ponder_results.get(reply)
+        self._ponder_results = {}
+        return result
+
+    def _threat_move(self):
+        """A move that wins by force or is required to stop the opponent's forced win, or None"""
+        solver = ThreatSolver(self.game, self.threat_budget, deadline=self._deadline)
+        me = self.game.current_player
+        opponent = 3 - me
+        size = self.game.board_size
+
+        # Win on the spot, or block a five
+        for player in (me, opponent):
+            fives = solver.five_moves(player)
+            if fives:
+                return divmod(min(fives), size)
+
+        line = solver.find_win(me)
+        if line:
+            return line[0]
+
+        opponent_line = solver.find_win(opponent)
+        if not opponent_line:
+            return None
+        defence_budget = solver.total_nodes + 4 * self.threat_budget
+
+        # Refute the opponent's winning sequence: occupy one of its points, or take the initiative with a four
+        candidates = {row * size + col for row, col in opponent_line}
+        candidates |= solver.blocking_moves(opponent) | solver.four_moves(me)
+        candidates = sorted(candidates, key=lambda index: -self.game.patterns.threat_score(index // size,
+                                                                                          index % size, me))
+        for index in candidates:
+            move = divmod(index, size)
+            self.game.make_move(*move)
+            refuted = solver.find_win(opponent) is None and not solver.exhausted
+            self.game.undo_move()
+            if refuted:
+                return move
+            if solver.total_nodes > defence_budget:
+                break
+
+        return None
+
+    def _iterative_deepening(self):
+        """Search depth 1, 2, 3... until the deadline set by get_best_move and return the last completed result"""
+        root_moves = len(self.game.move_history)
+        empty_cells = self.game.board_size * self.game.board_size - self.game.stone_count
+        best_move = None
+        self.completed_depth = 0
+
+        try:
+            # Each iteration starts from the previous one's table entries, killers and history
+            for depth in range(1, empty_cells + 1):
+                score, move = self._aspiration_search(depth, self.last_score)
+                best_move = move
+                self.last_score = score
+                self.completed_depth = depth
+
+                # A five is already within reach for one side
+                if abs(score) >= PATTERN_SCORES[5]:
+                    break
+        except SearchTimeout:
+            # Take back the moves of the interrupted search
+            while len(self.game.move_history) > root_moves:
+                self.game.undo_move()
+
+        # Not even depth 1 finished: fall back to the best-ordered candidate
+        if best_move is None and not self.game.game_over:
+            best_move = self._order_moves(self.game.get_valid_moves(), 1, None)[0]
+
+        return best_move
+
+    def _aspiration_search(self, depth, guess):
+        """Search with a window around the previous depth's score, and again with the full window if it falls outside"""
+        if self.search != 'pvs' or guess is None or abs(guess) >= PATTERN_SCORES[5]:
+            return self._search_root(depth)
+
+        alpha, beta = guess - self.aspiration_window, guess + self.aspiration_window
+        score, move = self._search_root(depth, alpha, beta)
+        if alpha < score < beta:
+            return score, move
+
+        if self.stats is not None:
+            self.stats.depths[depth].researches += 1
+        return self._search_root(depth)
+
+    def _search_root(self, depth, alpha=float('-inf'), beta=float('inf')):
+        """Search the current position to the given depth, in parallel when workers are configured"""
+        if self.stats is None:
+            return self._run_root_search(depth, alpha, beta)
+
+        # Nodes searched by parallel workers are not counted, only those of this process
+        depth_stats = self._depth_stats = self.stats.start_depth(depth)
+        start = time.perf_counter()
+        try:
+            result = self._run_root_search(depth, alpha, beta)
+        finally:
+            depth_stats.seconds += time.perf_counter() - start
+            self._depth_stats = None
+
+        depth_stats.completed = alpha < result[0] < beta  # Not when an aspiration window failed
+        if self.on_progress is not None:
+            self.on_progress(self.stats)
+        return result
+
+    def _run_root_search(self, depth, alpha, beta):
+        # The parallel search always searches the full window with minimax
+        if self.workers > 1 and depth >= 2 and not self.game.game_over:
+            return self._parallel_root_search(depth)
+        if self.search == 'pvs':
+            return self.negamax(depth, alpha, beta, 1)
+        return self.minimax(depth, alpha, beta, True)
+
+    def _parallel_root_search(self, depth):
+        """Search each root move in a worker process and pick the move the serial search would"""
+        tt_move = None
+        if self.tt is not None:
+            tt_key = self.game.hash ^ self.game.zobrist.perspective[self.game.current_player]
+            entry = self.tt.probe(tt_key)
+            if entry is not None:
+                tt_move = entry[3]
+
+        moves = self.game.get_valid_moves()
+        if self.move_ordering:
+            moves = self._order_moves(moves, depth, tt_move)
+
+        pool = self._get_pool()
+        self._search_id += 1
+        with self._shared_alpha.get_lock():
+            self._shared_alpha[0] = self._search_id
+            self._shared_alpha[1] = float('-inf')
+
+        config = (type(self.game), self.game.board_size, self.game.move_radius, self.tt_capacity,
+                  self.tt_replacement, self.move_ordering, self.top_k, self.quiescence, self.quiescence_depth,
+                  self.quiescence_nodes)
+        history = [(row, col) for row, col, _ in self.game.move_history]
+        time_left = None if self._deadline is None else self._deadline - time.perf_counter()
+        deadline = None if time_left is None else time.time() + time_left
+
+        futures = [pool.submit(_search_root_move, config, history, move, depth, self._search_id, deadline)
+                   for move in moves]
+        try:
+            results = [future.result() for future in futures]
+        except SearchTimeout:
+            for future in futures:
+                future.cancel()
+            raise
+
+        # A root move is exact when it beat the shared alpha it started with
+        best_index = max((index for index, (score, alpha_used) in enumerate(results) if score > alpha_used),
+                         key=lambda index: (results[index][0], -index))
+        best_score = results[best_index][0]
+
+        # An earlier move that failed low may tie the best score; the serial search would have kept it
+        for index in range(best_index):
+            score, alpha_used = results[index]
+            if alpha_used >= score >= best_score:
+                self.game.make_move(*moves[index])
+                exact_score, _ = self.minimax(depth - 1, float('-inf'), float('inf'), False)
+                self.game.undo_move()
+                if exact_score >= best_score:
+                    best_index = index
+                    break
+
+        if self.tt is not None:
+            self.tt.store(tt_key, depth, best_score, TranspositionTable.EXACT, moves[best_index])
+
+        return best_score, moves[best_index]
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._shared_alpha = multiprocessing.Array('d', [0.0, float('-inf')])
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_search_worker,
+                                             initargs=(self._shared_alpha,))
+        return self._pool
+
+    def close(self):
+        """Stop the pondering and shut down the worker processes of the parallel search"""
+        self.stop_pondering()
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+# State of a parallel search worker process
+_worker_shared_alpha = None
+_worker_ais = {}
+
+
+def _init_search_worker(shared_alpha):
+    global _worker_shared_alpha
+    _worker_shared_alpha = shared_alpha
+
+
+def _sync_game(game, moves):
+    """Bring a game to the position reached by the given moves, reusing the common prefix"""
+    common = 0
+    for (row, col, _), move in zip(game.move_history, moves):
+        if (row, col) != move:
+            break
+        common += 1
+
+    while len(game.move_history) > common:
+        game.undo_move()
+    for row, col in moves[common:]:
+        game.make_move(row, col)
+
+
+def _alternate_stones(black, white):
+    """(row, col, player) moves placing the black and white stones alternately, black first
+
+    The stones one side has beyond what alternating moves allow come last.
+    """
+    moves = []
+    for index in range(max(len(black), len(white))):
+        for player, stones in ((1, black), (2, white)):
+            if index < len(stones):
+                row, col = stones[index]
+                moves.append((row, col, player))
+    return moves
+
+
+def _search_root_move(config, moves, root_move, depth, search_id, deadline):
+    """Search one root move in a worker process, returning its score and the alpha it was searched with"""
+    (game_class, board_size, move_radius, tt_capacity, tt_replacement, move_ordering, top_k,
+     quiescence, quiescence_depth, quiescence_nodes) = config
+
+    # Each worker keeps its AI, and with it the transposition table and history, between moves
+    if config not in _worker_ais:
+        _worker_ais[config] = GomokuAI(game_class(board_size, move_radius), tt_capacity=tt_capacity,
+                                       tt_replacement=tt_replacement, move_ordering=move_ordering, top_k=top_k,
+                                       quiescence=quiescence, quiescence_depth=quiescence_depth,
+                                       quiescence_nodes=quiescence_nodes)
+    ai = _worker_ais[config]
+    game = ai.game
+    _sync_game(game, moves)
+
+    shared = _worker_shared_alpha
+    with shared.get_lock():
+        alpha = shared[1] if shared[0] == search_id else float('-inf')
+
+    if deadline is not None:
+        ai._deadline = time.perf_counter() + (deadline - time.time())
+
+    root_moves = len(game.move_history)
+    game.make_move(*root_move)
+    try:
+        score, _ = ai.minimax(depth - 1, alpha, float('inf'), False)
+    finally:
+        ai._deadline = None
+        while len(game.move_history) > root_moves:
+            game.undo_move()
+
+    with shared.get_lock():
+        if shared[0] == search_id and score > shared[1]:
+            shared[1] = score
+
+    return score, alpha
+
+
+class BoardEvaluator:
+    """Scores whole boards, or stacks of boards, with a few NumPy operations
+
+    Every 5-cell window is gathered through a precomputed index array and encoded as a
+    base-3 number that indexes the pattern score tables of PatternTracker.
+    """
+
+    _cache = {}
+
+    def __init__(self, board_size):
+        self.board_size = board_size
+
+        windows = []
+        directions = [(0, 1), (1, 0), (1, 1), (1, -1)]
+        for start_i in range(board_size):
+            for start_j in range(board_size):
+                for di, dj in directions:
+                    end_i, end_j = start_i + 4 * di, start_j + 4 * dj
+                    if not (0 <= end_i < board_size and 0 <= end_j < board_size):
+                        continue
+                    windows.append([(start_i + step * di) * board_size + start_j + step * dj for step in range(5)])
+
+        self.window_cells = np.array(windows, dtype=np.intp).reshape(-1, 5)  # (windows, 5) flat cell indices
+        self.place_values = 3 ** np.arange(4, -1, -1)
+        tables = PatternTracker.get_score_tables()
+        self.score_tables = np.array([[0] * 243, tables[1], tables[2]])
+
+    @classmethod
+    def for_size(cls, board_size):
+        if board_size not in cls._cache:
+            cls._cache[board_size] = cls(board_size)
+        return cls._cache[board_size]
+
+    def pattern_scores(self, boards):
+        """Total pattern score of each board, shape (3, count) indexed by player"""
+        flat = boards.reshape(len(boards), -1)
+        codes = flat[:, self.window_cells] @ self.place_values
+        return self.score_tables[:, codes].sum(axis=-1)
+
+    def distance_field(self, boards, player):
+        """Manhattan distance from every position to the nearest stone of player, shape (count, size, size)"""
+        size = self.board_size
+        unreachable = 4 * size  # Larger than any distance on the board
+        field = np.where(boards == player, 0, unreachable)
+
+        # Forward and backward sweeps along rows, then along columns
+        for j in range(1, size):
+            np.minimum(field[:, :, j], field[:, :, j - 1] + 1, out=field[:, :, j])
+        for j in range(size - 2, -1, -1):
+            np.minimum(field[:, :, j], field[:, :, j + 1] + 1, out=field[:, :, j])
+        for i in range(1, size):
+            np.minimum(field[:, i], field[:, i - 1] + 1, out=field[:, i])
+        for i in range(size - 2, -1, -1):
+            np.minimum(field[:, i], field[:, i + 1] + 1, out=field[:, i])
+
+        return field
+
+    def separation(self, boards, whose_turn):
+        """GomokuAI._calculate_separation for each board"""
+        mine = boards == whose_turn
+        my_count = mine.sum(axis=(1, 2))
+        has_opponent = (boards == 3 - whose_turn).any(axis=(1, 2))
+
+        total_min_distance = (self.distance_field(boards, 3 - whose_turn) * mine).sum(axis=(1, 2))
+        scored = (my_count > 0) & has_opponent
+        return np.where(scored, total_min_distance / np.maximum(my_count, 1) * 10, 0)
+
+    def evaluate(self, boards, whose_turn):
+        """GomokuAI.evaluate_board for each board"""
+        scores = self.pattern_scores(boards)
+        score_diff = scores[whose_turn] - scores[3 - whose_turn]
+        separation_score = self.separation(boards, whose_turn)
+
+        # If current player gets a higher score, increase the separation
+        return np.where(score_diff > 0, score_diff + separation_score, score_diff - separation_score)
+
+
+class DistanceField:
+    """Manhattan distance from every position to the nearest stone of each player, updated incrementally"""
+
+    # Per board size: row and column of every position
+    _coordinate_cache = {}
+
+    def __init__(self, board_size):
+        self.board_size = board_size
+        self.rows, self.cols = self._get_coordinates(board_size)
+        unreachable = np.full(board_size * board_size, 4 * board_size, dtype=np.int32)
+        self.fields = [None, unreachable, unreachable.copy()]  # Distance field per player (index 0 unused)
+        self.stones = [None, [], []]  # Flat indices of each player's stones, in the order placed
+        self.previous_fields = [None, [], []]  # Fields before each of the last stones, for remove
+
+    @classmethod
+    def _get_coordinates(cls, board_size):
+        if board_size not in cls._coordinate_cache:
+            rows, cols = np.divmod(np.arange(board_size * board_size, dtype=np.int32), board_size)
+            cls._coordinate_cache[board_size] = rows, cols
+
+        return cls._coordinate_cache[board_size]
+
+    def distances(self, stones):
+        """Distance from every position to each of the stones (flat indices), one row per stone"""
+        stone_rows, stone_cols = np.divmod(np.asarray(stones, dtype=np.int32)[:, np.newaxis], self.board_size)
+        return np.abs(self.rows - stone_rows) + np.abs(self.cols - stone_cols)
+
+    def place(self, row, col, player):
+        """Account for a stone placed at (row, col)"""
+        index = row * self.board_size + col
+        self.previous_fields[player].append(self.fields[player])
+        self.fields[player] = np.minimum(self.fields[player], np.abs(self.rows - row) + np.abs(self.cols - col))
+        self.stones[player].append(index)
+
+    def remove(self, row, col, player):
+        """Account for a stone of the given player removed from (row, col)"""
+        index = row * self.board_size + col
+        stones = self.stones[player]
+
+        if stones[-1] == index and self.previous_fields[player]:
+            stones.pop()
+            self.fields[player] = self.previous_fields[player].pop()
+            return
+
+        # Not the last stone placed: rebuild the field from the remaining stones
+        stones.remove(index)
+        self.previous_fields[player] = []
+        if stones:
+            self.fields[player] = self.distances(stones).min(axis=0)
+        else:
+            self.fields[player] = np.full(self.board_size * self.board_size, 4 * self.board_size, dtype=np.int32)
+
+    def separation(self, whose_turn):
+        """GomokuAI._calculate_separation for the current stones"""
+        my_stones = self.stones[whose_turn]
+        if not my_stones or not self.stones[3 - whose_turn]:
+            return 0
+
+        total_min_distance = int(self.fields[3 - whose_turn][my_stones].sum())
+        return total_min_distance / len(my_stones) * 10
+
+
+class SparseDistanceField:
+    """Distance from each stone to the nearest opponent stone, kept from the stones alone
+
+    Placing a stone costs one pass over the opponent's stones instead of a pass over the board.
+    """
+
+    def __init__(self, board_size):
+        self.board_size = board_size
+        self.stones = [None, [], []]  # (row, col) of each player's stones, in the order placed
+        self.nearest = [None, {}, {}]  # Per player: stone -> distance to the nearest opponent stone
+        self.totals = [None, 0, 0]  # Per player: sum of nearest
+        self.placed = []  # (row, col, player) in the order placed
+        self.changes = []  # Per placed stone: (opponent stone, its previous nearest) for each stone it came closer to
+
+    def place(self, row, col, player):
+        """Account for a stone placed at (row, col)"""
+        opponent_nearest = self.nearest[3 - player]
+        best = 4 * self.board_size  # Unreachable while the opponent has no stones
+        changes = []
+
+        for stone in self.stones[3 - player]:
+            distance = abs(stone[0] - row) + abs(stone[1] - col)
+            if distance < best:
+                best = distance
+            if distance < opponent_nearest[stone]:
+                changes.append((stone, opponent_nearest[stone]))
+                self.totals[3 - player] += distance - opponent_nearest[stone]
+                opponent_nearest[stone] = distance
+
+        self.stones[player].append((row, col))
+        self.nearest[player][row, col] = best
+        self.totals[player] += best
+        self.placed.append((row, col, player))
+        self.changes.append(changes)
+
+    def remove(self, row, col, player):
+        """Account for a stone of the given player removed from (row, col)"""
+        if self.placed and self.placed[-1] == (row, col, player):
+            self.placed.pop()
+            opponent_nearest = self.nearest[3 - player]
+            for stone, distance in self.changes.pop():
+                self.totals[3 - player] += distance - opponent_nearest[stone]
+                opponent_nearest[stone] = distance
+
+            self.stones[player].pop()
+            self.totals[player] -= self.nearest[player].pop((row, col))
+            return
+
+        # Not the last stone placed: place the remaining stones again
+        placed = [stone for stone in self.placed if stone != (row, col, player)]
+        self.__init__(self.board_size)
+        for stone in placed:
+            self.place(*stone)
+
+    def separation(self, whose_turn):
+        """GomokuAI._calculate_separation for the current stones"""
+        my_stones = self.stones[whose_turn]
+        if not my_stones or not self.stones[3 - whose_turn]:
+            return 0
+
+        return self.totals[whose_turn] / len(my_stones) * 10
+
+
+class MoveFrontier:
+    """Empty positions within a radius of any stone, updated incrementally as stones are placed and removed"""
+
+    # Per (board size, radius): positions within the radius of each position
+    _neighbor_cache = {}
+
+    def __init__(self, board_size, radius=1):
+        self.board_size = board_size
+        self.radius = radius
+        self.neighbors = self._get_neighbors(board_size, radius)
+        self.near_counts = [0] * (board_size * board_size)  # Stones within the radius of each position
+        self.occupied = bytearray(board_size * board_size)
+        self.cells = set()  # Flat indices of the frontier positions
+
+    @classmethod
+    def _get_neighbors(cls, board_size, radius):
+        key = (board_size, radius)
+        if key not in cls._neighbor_cache:
+            neighbors = []
+            for i in range(board_size):
+                for j in range(board_size):
+                    neighbors.append([
+                        ni * board_size + nj
+                        for ni in range(max(0, i - radius), min(board_size, i + radius + 1))
+                        for nj in range(max(0, j - radius), min(board_size, j + radius + 1))
+                        if (ni, nj) != (i, j)
+                    ])
+            cls._neighbor_cache[key] = neighbors
+
+        return cls._neighbor_cache[key]
+
+    def place(self, row, col):
+        """Account for a stone placed at (row, col)"""
+        index = row * self.board_size + col
+        near_counts, occupied, cells = self.near_counts, self.occupied, self.cells
+
+        occupied[index] = 1
+        cells.discard(index)
+        for neighbor in self.neighbors[index]:
+            near_counts[neighbor] += 1
+            if near_counts[neighbor] == 1 and not occupied[neighbor]:
+                cells.add(neighbor)
+
+    def remove(self, row, col):
+        """Account for a stone removed from (row, col)"""
+        index = row * self.board_size + col
+        near_counts, cells = self.near_counts, self.cells
+
+        self.occupied[index] = 0
+        for neighbor in self.neighbors[index]:
+            near_counts[neighbor] -= 1
+            if near_counts[neighbor] == 0:
+                cells.discard(neighbor)
+        if near_counts[index]:
+            cells.add(index)
+
+    def moves(self):
+        """Frontier positions as (row, col) in row-major order"""
+        return [divmod(index, self.board_size) for index in sorted(self.cells)]
+
+
+class SparseMoveFrontier(MoveFrontier):
+    """MoveFrontier that keeps its counts in dicts, for boards of any size"""
+
+    # Per (board size, radius): positions within the radius of each position, filled on demand
+    _sparse_neighbors = {}
+
+    def __init__(self, board_size, radius=1):
+        self.board_size = board_size
+        self.radius = radius
+        key = (board_size, radius)
+        if key not in self._sparse_neighbors:
+            self._sparse_neighbors[key] = _LazyTable(self._neighbors_of)
+        self.neighbors = self._sparse_neighbors[key]
+        self.near_counts = {}  # Stones within the radius, for positions that have any
+        self.occupied = set()
+        self.cells = set()
+
+    def _neighbors_of(self, index):
+        size, radius = self.board_size, self.radius
+        i, j = divmod(index, size)
+        return [
+            ni * size + nj
+            for ni in range(max(0, i - radius), min(size, i + radius + 1))
+            for nj in range(max(0, j - radius), min(size, j + radius + 1))
+            if (ni, nj) != (i, j)
+        ]
+
+    def place(self, row, col):
+        """Account for a stone placed at (row, col)"""
+        index = row * self.board_size + col
+        near_counts, occupied, cells = self.near_counts, self.occupied, self.cells
+
+        occupied.add(index)
+        cells.discard(index)
+        for neighbor in self.neighbors[index]:
+            count = near_counts.get(neighbor, 0) + 1
+            near_counts[neighbor] = count
+            if count == 1 and neighbor not in occupied:
+                cells.add(neighbor)
+
+    def remove(self, row, col):
+        """Account for a stone removed from (row, col)"""
+        index = row * self.board_size + col
+        near_counts, cells = self.near_counts, self.cells
+
+        self.occupied.discard(index)
+        for neighbor in self.neighbors[index]:
+            count = near_counts[neighbor] - 1
+            if count:
+                near_counts[neighbor] = count
+            else:
+                del near_counts[neighbor]
+                cells.discard(neighbor)
+        if index in near_counts:
+            cells.add(index)
+
+
+class ThreatBudgetExceeded(Exception):
+    """Raised inside the threat-space search when its node budget runs out"""
+
+
+class ThreatSolver:
+    """Threat-space search for forced wins
+
+    The attacker only tries moves that make a four (VCF) or, for VCT, a three, and the
+    defender only the replies that can stop the threat, so forcing sequences are found
+    much deeper than the full-width search reaches.
+    """
+
+    def __init__(self, game, node_budget=2000, max_plies=20, use_threes=True, deadline=None):
+        self.game = game
+        self.node_budget = node_budget
+        self.deadline = deadline  # time.perf_counter() value after which a search gives up as if out of budget
+        self.max_plies = max_plies
+        self.use_threes = use_threes  # Also search for wins by threes (VCT), not just fours (VCF)
+        self.nodes = 0  # Nodes of the last find_win
+        self.total_nodes = 0
+        self.exhausted = False  # The last find_win ran out of budget, so a missing win proves nothing
+
+    def _gap_moves(self, player, count, windows):
+        """Empty positions (flat indices) of the windows with count stones of player and none of the other"""
+        patterns = self.game.patterns
+        codes, window_cells = patterns.codes, patterns.window_cells
+        gaps = PatternTracker.get_gap_tables()[player][count]
+
+        moves = set()
+        for window in windows:
+            for step in gaps[codes[window]]:
+                moves.add(window_cells[window][step])
+        return moves
+
+    def five_moves(self, player):
+        """Positions where a stone of player completes five"""
+        return self._gap_moves(player, 4, self.game.patterns.hot_windows)
+
+    def four_moves(self, player):
+        """Positions where a stone of player makes a four"""
+        return self._gap_moves(player, 3, self.game.patterns.hot_windows)
+
+    def three_moves(self, player):
+        """Positions where a stone of player makes a three"""
+        return self._gap_moves(player, 2, self.game.patterns.active_windows())
+
+    def blocking_moves(self, attacker, threats=None):
+        """Positions that take a gap of one of attacker's threes, stopping the four it could become
+
+        With threats, a set of positions, only the threes with a gap among them count.
+        """
+        windows = self.game.patterns.hot_windows
+        if threats is not None:
+            patterns = self.game.patterns
+            codes, window_cells = patterns.codes, patterns.window_cells
+            gaps = PatternTracker.get_gap_tables()[attacker][3]
+            windows = [window for window in windows
+                       if any(window_cells[window][step] in threats for step in gaps[codes[window]])]
+        return self._gap_moves(attacker, 3, windows)
+
+    def find_win(self, player):
+        """Forced winning sequence for player as a list of (row, col), or None
+
+        If player is not the side to move, the search is done as if it were. Each call has
+        its own node budget.
+        """
+        self.nodes = 0
+        self.exhausted = False
+        if self.game.game_over:
+            return None
+
+        current_player = self.game.current_player
+        root_moves = len(self.game.move_history)
+        self.game.current_player = player
+
+        try:
+            line = self._attack(player, 0, False)
+            if line is None and self.use_threes:
+                line = self._attack(player, 0, True)
+        except ThreatBudgetExceeded:
+            self.exhausted = True
+            line = None
+        finally:
+            while len(self.game.move_history) > root_moves:
+                self.game.undo_move()
+            self.game.current_player = current_player
+
+        if line is None:
+            return None
+        return [divmod(index, self.game.board_size) for index in line]
+
+    def _play(self, index):
+        self.game.make_move(*divmod(index, self.game.board_size))
+        self.nodes += 1
+        self.total_nodes += 1
+        if self.nodes > self.node_budget or (self.deadline is not None and time.perf_counter() > self.deadline):
+            raise ThreatBudgetExceeded
+
+    def _attack(self, attacker, plies, use_threes):
+        """Attacker to move: a winning line of flat indices, or None"""
+        defender = 3 - attacker
+
+        wins = self.five_moves(attacker)
+        if wins:
+            return [min(wins)]
+        if plies >= self.max_plies:
+            return None
+
+        threats = self.five_moves(defender)
+        if len(threats) > 1:
+            return None
+        if threats:
+            candidates = threats  # The block is forced; it has to keep the attack going
+        else:
+            candidates = self.four_moves(attacker)
+            if use_threes:
+                candidates |= self.three_moves(attacker)
+
+        # Fours first, then the rest in a fixed order
+        threat_score = self.game.patterns.threat_score
+        size = self.game.board_size
+        ordered = sorted(candidates, key=lambda index: -threat_score(index // size, index % size, attacker))
+
+        for index in ordered:
+            self._play(index)
+            line = self._defend(attacker, plies + 1, use_threes)
+            self.game.undo_move()
+            if line is not None:
+                return [index] + line
+
+        return None
+
+    def _defend(self, attacker, plies, use_threes):
+        """Defender to move after a threat: the attacker's winning line against every reply, or None"""
+        defender = 3 - attacker
+
+        if self.five_moves(defender):
+            return None
+
+        wins = self.five_moves(attacker)
+        if len(wins) > 1:  # Open or double four
+            return []
+        if wins:
+            replies = wins
+        elif use_threes and self.has_double_four_move(attacker):
+            # Stop the coming four: take a gap of one of the attacker's threes, or counter with a four
+            replies = self.blocking_moves(attacker) | self.four_moves(defender)
+        else:
+            return None
+
+        line = None
+        for index in sorted(replies):
+            self._play(index)
+            if self.game.game_over:
+                self.game.undo_move()
+                return None
+
+            sub_line = self._attack(attacker, plies + 1, use_threes)
+            self.game.undo_move()
+            if sub_line is None:
+                return None
+            if line is None:
+                line = [index] + sub_line
+
+        return line
+
+    def double_four_moves(self, player):
+        """Positions where a stone of player makes two fives possible at once (an open four or a double four)
+
+        A stone on a gap of a three leaves the other gap as a five, so this is read off the
+        threes without playing any move.
+        """
+        patterns = self.game.patterns
+        codes, window_cells = patterns.codes, patterns.window_cells
+        gaps = PatternTracker.get_gap_tables()[player][3]
+
+        fives_after = {}  # Gap of a three -> the fives a stone there leaves
+        for window in patterns.hot_windows:
+            steps = gaps[codes[window]]
+            if steps:
+                first, second = window_cells[window][steps[0]], window_cells[window][steps[1]]
+                fives_after.setdefault(first, set()).add(second)
+                fives_after.setdefault(second, set()).add(first)
+
+        fives = self.five_moves(player)
+        return {index for index, cells in fives_after.items() if len(cells | (fives - {index})) > 1}
+
+    def has_double_four_move(self, player):
+        """Whether player, if it were to move, has a move that makes two fives possible at once"""
+        return bool(self.double_four_moves(player))
+
+
+class OpeningBook:
+    """Best moves for opening positions, memory-mapped from a file built offline
+
+    Positions are keyed by the smallest Zobrist hash over the 8 board symmetries, so a
+    rotated or mirrored opening finds the same entry. The file holds a 16-byte header and
+    then the sorted keys, the moves (flat index in the canonical orientation) and the
+    scores as separate arrays; a probe is a binary search that only reads the pages it
+    touches.
+    """
+
+    MAGIC = b'GMKB'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHHHI')  # magic, version, board size, max stones, unused, entry count
+
+    # Per board size: the 8 symmetries as (forward, inverse) maps of flat indices
+    _symmetries = {}
+
+    def __init__(self, path):
+        self.path = path
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        magic, version, board_size, max_stones, _, count = self.HEADER.unpack(bytes(data[:self.HEADER.size]))
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"{path} is not a Gomoku opening book")
+
+        self.board_size = board_size
+        self.max_stones = max_stones  # Positions with more stones are never in the book
+        self.count = count
+
+        offset = self.HEADER.size
+        self.keys = data[offset:offset + 8 * count].view('<u8')
+        offset += 8 * count
+        self.moves = data[offset:offset + 2 * count].view('<u2')
+        offset += 2 * count
+        self.scores = data[offset:offset + 4 * count].view('<f4')
+
+    @classmethod
+    def symmetries(cls, board_size):
+        if board_size not in cls._symmetries:
+            last = board_size - 1
+            transforms = [
+                lambda r, c: (r, c),
+                lambda r, c: (c, last - r),  # Rotations
+                lambda r, c: (last - r, last - c),
+                lambda r, c: (last - c, r),
+                lambda r, c: (r, last - c),  # Reflections
+                lambda r, c: (last - r, c),
+                lambda r, c: (c, r),
+                lambda r, c: (last - c, last - r),
+            ]
+
+            symmetries = []
+            for transform in transforms:
+                forward = [0] * (board_size * board_size)
+                inverse = [0] * (board_size * board_size)
+                for row in range(board_size):
+                    for col in range(board_size):
+                        new_row, new_col = transform(row, col)
+                        forward[row * board_size + col] = new_row * board_size + new_col
+                        inverse[new_row * board_size + new_col] = row * board_size + col
+                symmetries.append((forward, inverse))
+            cls._symmetries[board_size] = symmetries
+
+        return cls._symmetries[board_size]
+
+    @classmethod
+    def canonical_key(cls, board_size, stones):
+        """(key, symmetry index) of the position made of the given (row, col, player) stones"""
+        keys = ZobristKeys.for_size(board_size)
+        side = keys.side if len(stones) % 2 else 0
+
+        best = None
+        for index, (forward, _) in enumerate(cls.symmetries(board_size)):
+            key = side
+            for row, col, player in stones:
+                key ^= keys.stones[player][forward[row * board_size + col]]
+            if best is None or key < best[0]:
+                best = (key, index)
+
+        return best
+
+    def lookup(self, game):
+        """(row, col, score) of the book move for the game's position, or None"""
+        if game.board_size != self.board_size or game.stone_count > self.max_stones or game.game_over:
+            return None
+
+        key, symmetry = self.canonical_key(game.board_size, game.move_history)
+        position = np.searchsorted(self.keys, np.uint64(key))
+        if position == self.count or self.keys[position] != key:
+            return None
+
+        _, inverse = self.symmetries(game.board_size)[symmetry]
+        row, col = divmod(inverse[int(self.moves[position])], game.board_size)
+        if not game.is_empty(row, col):
+            return None
+
+        return row, col, float(self.scores[position])
+
+    @classmethod
+    def write(cls, path, board_size, entries, max_stones):
+        """Write a book from a dictionary of canonical key -> (canonical flat move, score)"""
+        keys = sorted(entries)
+        with open(path, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, board_size, max_stones, 0, len(keys)))
+            f.write(np.array(keys, dtype='<u8').tobytes())
+            f.write(np.array([entries[key][0] for key in keys], dtype='<u2').tobytes())
+            f.write(np.array([entries[key][1] for key in keys], dtype='<f4').tobytes())
+
+
+class GameArchive:
+    """Recorded games, memory-mapped from a compact binary file
+
+    Each move takes two bytes, its row and its column; players alternate from black, so they
+    are not stored. The file holds a 24-byte header, the moves of all games back to back, and
+    then an index of where each game starts plus each game's winner, so game N is found in
+    O(1) and only the pages it touches are read.
+    """
+
+    MAGIC = b'GMKR'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHQQ')  # magic, version, board size, game count, total moves
+
+    def __init__(self, path):
+        self.path = path
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        magic, version, board_size, count, total_moves = self.HEADER.unpack(bytes(data[:self.HEADER.size]))
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"{path} is not a Gomoku game archive")
+
+        self.board_size = board_size
+        self.count = count
+
+        offset = self.HEADER.size
+        self.move_data = data[offset:offset + 2 * total_moves].reshape(-1, 2)  # (row, col) of every move
+        offset += 2 * total_moves
+        offset += -offset % 8
+        self.offsets = data[offset:offset + 8 * (count + 1)].view('<u8')  # First move of each game, then the end
+        offset += 8 * (count + 1)
+        self.winners = data[offset:offset + count]  # 0 for a draw or unfinished game, else the winning player
+
+    def __len__(self):
+        return self.count
+
+    def moves(self, index, ply=None):
+        """(row, col) array of the first ply moves of a game (all of them by default), without copying"""
+        if not 0 <= index < self.count:
+            raise IndexError(f"Game {index} not in an archive of {self.count}")
+
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        if ply is not None:
+            end = min(end, start + ply)
+        return self.move_data[start:end]
+
+    def replay(self, index, ply=None, game_class=GomokuGame):
+        """A game_class game after the first ply moves of a game"""
+        game = game_class(self.board_size)
+        for row, col in self.moves(index, ply).tolist():
+            game.make_move(row, col)
+        return game
+
+    def positions(self, index):
+        """Board after each move of a game, shape (moves + 1, size, size) starting with the empty board"""
+        moves = self.moves(index).astype(np.intp)
+        cells = self.board_size * self.board_size
+
+        # Each position adds one stone, so a running maximum over the plies fills in the earlier ones
+        boards = np.zeros((len(moves) + 1, cells), dtype=np.int8)
+        boards[np.arange(1, len(moves) + 1), moves[:, 0] * self.board_size + moves[:, 1]] = \
+            1 + np.arange(len(moves)) % 2
+        np.maximum.accumulate(boards, axis=0, out=boards)
+        return boards.reshape(-1, self.board_size, self.board_size)
+
+    def boards_at(self, ply, indices=None):
+        """Board of each game after ply moves (or all its moves if shorter), shape (games, size, size)"""
+        indices = np.arange(self.count) if indices is None else np.asarray(indices)
+        starts = self.offsets[indices].astype(np.intp)
+        lengths = np.minimum(self.offsets[indices + 1].astype(np.intp) - starts, ply)
+
+        # One entry per stone to place: the game it belongs to and its ply within that game
+        games = np.repeat(np.arange(len(indices)), lengths)
+        steps = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        moves = self.move_data[np.repeat(starts, lengths) + steps].astype(np.intp)
+
+        boards = np.zeros((len(indices), self.board_size * self.board_size), dtype=np.int8)
+        boards[games, moves[:, 0] * self.board_size + moves[:, 1]] = 1 + steps % 2
+        return boards.reshape(-1, self.board_size, self.board_size)
+
+    @classmethod
+    def write(cls, path, board_size, games):
+        """Write an archive from an iterable of (moves, winner), returning the number of games written"""
+        with GameArchiveWriter(path, board_size) as writer:
+            for moves, winner in games:
+                writer.add(moves, winner)
+        return writer.count
+
+
+class GameArchiveWriter:
+    """Appends games to a new GameArchive file one at a time, finishing the index on close"""
+
+    def __init__(self, path, board_size):
+        if not 0 < board_size <= 256:
+            raise ValueError(f"Game archives store coordinates in one byte; board size {board_size} is too large")
+
+        self.board_size = board_size
+        self.file = open(path, 'wb')
+        self.file.write(bytes(GameArchive.HEADER.size))  # Filled in by close
+        self.offsets = [0]
+        self.winners = bytearray()
+        self.count = 0
+
+    def add(self, moves, winner=None):
+        """Append a game given as (row, col) moves from the empty board"""
+        self.file.write(np.asarray(moves, dtype=np.uint8).reshape(-1, 2).tobytes())
+        self.offsets.append(self.offsets[-1] + len(moves))
+        self.winners.append(winner or 0)
+        self.count += 1
+
+    def add_game(self, game):
+        """Append the moves of a GomokuGame"""
+        self.add([(row, col) for row, col, _ in game.move_history], game.winner)
+
+    def close(self):
+        if self.file.closed:
+            return
+
+        total_moves = self.offsets[-1]
+        self.file.write(bytes(-(GameArchive.HEADER.size + 2 * total_moves) % 8))
+        self.file.write(np.array(self.offsets, dtype='<u8').tobytes())
+        self.file.write(bytes(self.winners))
+
+        self.file.seek(0)
+        self.file.write(GameArchive.HEADER.pack(GameArchive.MAGIC, GameArchive.VERSION, self.board_size,
+                                                self.count, total_moves))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget runs out"""
+
+
+class SearchStats:
+    """Statistics of one get_best_move call, with the counters of each search depth"""
+
+    def __init__(self):
+        self.source = None  # Where the move came from: 'ponder', 'book', 'threat' or 'search'
+        self.seconds = 0.0
+        self.threat_seconds = 0.0
+        self.depths = {}  # Root depth -> DepthStats, in the order they were searched
+
+    def start_depth(self, depth):
+        """Counters for a depth, kept when the depth is searched again with a wider window"""
+        if depth not in self.depths:
+            self.depths[depth] = DepthStats(depth)
+        return self.depths[depth]
+
+    @property
+    def nodes(self):
+        return sum(depth_stats.nodes for depth_stats in self.depths.values())
+
+    @property
+    def completed_depth(self):
+        return max((depth for depth, depth_stats in self.depths.items() if depth_stats.completed), default=0)
+
+    def as_dict(self):
+        """Return the statistics as a dictionary"""
+        return {
+            'source': self.source,
+            'seconds': self.seconds,
+            'threat_seconds': self.threat_seconds,
+            'nodes': self.nodes,
+            'completed_depth': self.completed_depth,
+            'depths': [depth_stats.as_dict() for depth_stats in self.depths.values()],
+        }
+
+
+class DepthStats:
+    """Counters and timings of the search to one root depth"""
+
+    def __init__(self, depth):
+        self.depth = depth
+        self.completed = False  # False when the time budget ran out during this depth
+        self.nodes = 0  # minimax calls
+        self.leaves = 0  # Positions scored by the evaluation
+        self.interior_nodes = 0  # Nodes whose moves were searched
+        self.children = 0  # Moves searched below the interior nodes
+        self.cutoffs = 0  # Beta cutoffs
+        self.first_move_cutoffs = 0  # Cutoffs caused by the first move searched
+        self.researches = 0  # Principal variation and aspiration searches repeated with a wider window
+        self.quiescence_nodes = 0  # Nodes of the quiescence searches below the leaves
+
+        # Seconds spent in the evaluation, in generating and ordering moves, and in making and undoing moves
+        self.seconds = 0.0
+        self.evaluate_seconds = 0.0
+        self.move_gen_seconds = 0.0
+        self.make_move_seconds = 0.0
+
+    @property
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def branching_factor(self):
+        """Average number of moves searched at each interior node"""
+        return self.children / self.interior_nodes if self.interior_nodes else 0.0
+
+    @property
+    def effective_branching_factor(self):
+        """Branching factor b of a uniform tree of this depth with as many nodes, nodes = b ** depth"""
+        return self.nodes ** (1 / self.depth) if self.nodes and self.depth else 0.0
+
+    def as_dict(self):
+        """Return the counters as a dictionary"""
+        return {
+            'depth': self.depth,
+            'completed': self.completed,
+            'nodes': self.nodes,
+            'leaves': self.leaves,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoff_rate': self.first_move_cutoff_rate,
+            'researches': self.researches,
+            'quiescence_nodes': self.quiescence_nodes,
+            'branching_factor': self.branching_factor,
+            'effective_branching_factor': self.effective_branching_factor,
+            'seconds': self.seconds,
+            'evaluate_seconds': self.evaluate_seconds,
+            'move_gen_seconds': self.move_gen_seconds,
+            'make_move_seconds': self.make_move_seconds,
+        }
+
+
+class ZobristKeys:
+    """Fixed random 64-bit keys used to hash board positions"""
+
+    _cache = {}
+
+    def __init__(self, board_size):
+        # Seeded so that hashes are the same in every process
+        rng = random.Random(board_size)
+        cells = board_size * board_size
+        self.stones = [None, [rng.getrandbits(64) for _ in range(cells)], [rng.getrandbits(64) for _ in range(cells)]]
+        self.side = rng.getrandbits(64)  # Toggled on every move
+        self.perspective = [0, 0, rng.getrandbits(64)]  # Distinguishes which player a score belongs to
+
+    @classmethod
+    def for_size(cls, board_size):
+        if board_size not in cls._cache:
+            cls._cache[board_size] = cls(board_size)
+        return cls._cache[board_size]
+
+
+class SparseZobristKeys:
+    """Zobrist keys for boards of any size, derived from the position with a fixed mixing function"""
+
+    def __init__(self):
+        rng = random.Random('sparse')
+        self.stones = [None, _LazyTable(lambda index: self._mix(3 * index + 1)),
+                       _LazyTable(lambda index: self._mix(3 * index + 2))]
+        self.side = rng.getrandbits(64)
+        self.perspective = [0, 0, rng.getrandbits(64)]
+
+    @staticmethod
+    def _mix(value):
+        """splitmix64 finalizer: a well-spread 64-bit key for each value"""
+        mask = (1 << 64) - 1
+        value = (value + 0x9E3779B97F4A7C15) & mask
+        value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & mask
+        value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & mask
+        return value ^ (value >> 31)
+
+
+class TranspositionTable:
+    """Fixed-capacity table of search results keyed by Zobrist hash"""
+
+    EXACT = 0
+    LOWER_BOUND = 1
+    UPPER_BOUND = 2
+
+    def __init__(self, capacity, replacement='depth'):
+        if replacement not in ('depth', 'always'):
+            raise ValueError(f"Unknown replacement policy: {replacement}")
+
+        self.capacity = capacity
+        self.replacement = replacement  # 'depth' keeps the deeper entry on collision, 'always' overwrites
+        self.slots = [None] * capacity
+
+        # Counters for tuning
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def probe(self, key):
+        """Return (depth, score, flag, best_move) stored for the key, or None"""
+        entry = self.slots[key % self.capacity]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1:]
+
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, score, flag, best_move):
+        """Store a search result, evicting the entry in its slot according to the replacement policy"""
+        index = key % self.capacity
+        entry = self.slots[index]
+
+        if entry is not None and entry[0] != key:
+            if self.replacement == 'depth' and entry[1] > depth:
+                return
+            self.evictions += 1
+
+        self.slots[index] = (key, depth, score, flag, best_move)
+        self.stores += 1
+
+    def clear(self):
+        """Remove all entries and reset the counters"""
+        self.slots = [None] * self.capacity
+        self.hits = self.misses = self.stores = self.evictions = 0
+
+    def get_stats(self):
+        """Return the table counters as a dictionary"""
+        used = sum(1 for entry in self.slots if entry is not None)
+        return {
+            'capacity': self.capacity,
+            'used': used,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+        }
+
+
+class PatternTracker:
+    """Pattern scores of every 5-cell window, updated incrementally as stones are placed and removed"""
+
+    # Per board size: windows passing through each cell as (window index, place value), and the cells of each window
+    _layouts = {}
+    # Score of each base-3 window code for players 1 and 2
+    _score_tables = None
+    # Per player and stone count: empty steps of each window code holding only that player's stones
+    _gap_tables = None
+    # Whether each window code belongs in hot_windows
+    _hot_codes = None
+
+    def __init__(self, board_size):
+        self.board_size = board_size
+        self.cell_windows, self.window_cells = self._get_layout(board_size)
+        self.codes = [0] * len(self.window_cells)  # Base-3 encoding of the stones in each window
+        self.scores = [0, 0, 0]  # Total pattern score per player (index 0 unused)
+        self.score_tables = self.get_score_tables()
+
+        # Windows holding at least three stones of one player and none of the other
+        self.hot_windows = set()
+        self.hot_codes = self.get_hot_codes()
+
+    @classmethod
+    def _get_layout(cls, board_size):
+        if board_size not in cls._layouts:
+            cell_windows = [[] for _ in range(board_size * board_size)]
+            window_cells = []
+            directions = [(0, 1), (1, 0), (1, 1), (1, -1)]
+
+            # Same window order as GomokuAI.evaluate_board
+            for start_i in range(board_size):
+                for start_j in range(board_size):
+                    for di, dj in directions:
+                        end_i, end_j = start_i + 4 * di, start_j + 4 * dj
+                        if not (0 <= end_i < board_size and 0 <= end_j < board_size):
+                            continue
+
+                        cells = []
+                        for step in range(5):
+                            i, j = start_i + step * di, start_j + step * dj
+                            cell_windows[i * board_size + j].append((len(window_cells), 3 ** (4 - step)))
+                            cells.append(i * board_size + j)
+                        window_cells.append(cells)
+
+            cls._layouts[board_size] = (cell_windows, window_cells)
+
+        return cls._layouts[board_size]
+
+    @classmethod
+    def get_score_tables(cls):
+        """Pattern score of every base-3 window code, as a list per player (index 0 unused)"""
+        if cls._score_tables is None:
+            tables = [None, [0] * 243, [0] * 243]
+            for code in range(243):
+                line = [(code // 3 ** (4 - step)) % 3 for step in range(5)]
+                for player in (1, 2):
+                    pattern = GomokuAI._check_pattern(line, player)
+                    tables[player][code] = PATTERN_SCORES.get(pattern, 0)
+            cls._score_tables = tables
+
+        return cls._score_tables
+
+    @classmethod
+    def get_gap_tables(cls):
+        """tables[player][count][code]: empty steps of a window with count stones of player and none of the other"""
+        if cls._gap_tables is None:
+            tables = [None] + [[[()] * 243 for _ in range(6)] for _ in (1, 2)]
+            for code in range(243):
+                line = [(code // 3 ** (4 - step)) % 3 for step in range(5)]
+                for player in (1, 2):
+                    if 3 - player not in line:
+                        tables[player][line.count(player)][code] = tuple(step for step in range(5) if line[step] == 0)
+            cls._gap_tables = tables
+
+        return cls._gap_tables
+
+    @classmethod
+    def get_hot_codes(cls):
+        if cls._hot_codes is None:
+            hot_codes = []
+            for code in range(243):
+                line = [(code // 3 ** (4 - step)) % 3 for step in range(5)]
+                black, white = line.count(1), line.count(2)
+                hot_codes.append((black >= 3 and white == 0) or (white >= 3 and black == 0))
+            cls._hot_codes = hot_codes
+
+        return cls._hot_codes
+
+    def active_windows(self):
+        """Windows that may hold stones"""
+        return range(len(self.codes))
+
+    def place(self, row, col, player):
+        """Account for a stone placed at (row, col)"""
+        self._update(row, col, player)
+
+    def remove(self, row, col, player):
+        """Account for a stone of the given player removed from (row, col)"""
+        self._update(row, col, -player)
+
+    def threat_score(self, row, col, player):
+        """How much a stone at the empty (row, col) would raise player's score and lower the opponent's"""
+        codes = self.codes
+        own_table, other_table = self.score_tables[player], self.score_tables[3 - player]
+        score = 0
+
+        for window, value in self.cell_windows[row * self.board_size + col]:
+            old_code = codes[window]
+            new_code = old_code + player * value
+            score += own_table[new_code] - own_table[old_code] + other_table[old_code] - other_table[new_code]
+
+        return score
+
+    def _update(self, row, col, delta):
+        codes, hot_codes = self.codes, self.hot_codes
+        black_table, white_table = self.score_tables[1], self.score_tables[2]
+        black_delta = white_delta = 0
+
+        for window, value in self.cell_windows[row * self.board_size + col]:
+            old_code = codes[window]
+            new_code = old_code + delta * value
+            codes[window] = new_code
+            black_delta += black_table[new_code] - black_table[old_code]
+            white_delta += white_table[new_code] - white_table[old_code]
+
+            if hot_codes[new_code] != hot_codes[old_code]:
+                if hot_codes[new_code]:
+                    self.hot_windows.add(window)
+                else:
+                    self.hot_windows.discard(window)
+
+        self.scores[1] += black_delta
+        self.scores[2] += white_delta
+
+
+class SparsePatternTracker(PatternTracker):
+    """PatternTracker that only stores the windows holding stones, for boards of any size
+
+    Window w starts at flat index w // 4 and runs in direction w % 4 of DIRECTIONS. The windows
+    through each position are worked out the first time a stone is placed there.
+    """
+
+    DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+    # Per board size: windows passing through each position as (window, place value), filled on demand
+    _sparse_layouts = {}
+
+    def __init__(self, board_size):
+        self.board_size = board_size
+        if board_size not in self._sparse_layouts:
+            self._sparse_layouts[board_size] = _LazyTable(self._windows_through)
+        self.cell_windows = self._sparse_layouts[board_size]
+        self.window_cells = _LazyTable(self._cells_of)
+        self.codes = {}  # Window -> base-3 code, for windows holding stones only
+        self.scores = [0, 0, 0]
+        self.score_tables = self.get_score_tables()
+        self.hot_windows = set()
+        self.hot_codes = self.get_hot_codes()
+
+    def _windows_through(self, index):
+        size = self.board_size
+        row, col = divmod(index, size)
+        windows = []
+        for direction, (di, dj) in enumerate(self.DIRECTIONS):
+            for step in range(5):
+                start_i, start_j = row - step * di, col - step * dj
+                end_i, end_j = start_i + 4 * di, start_j + 4 * dj
+                if 0 <= start_i < size and 0 <= start_j < size and 0 <= end_i < size and 0 <= end_j < size:
+                    windows.append(((start_i * size + start_j) * 4 + direction, 3 ** (4 - step)))
+        return windows
+
+    def _cells_of(self, window):
+        start, direction = divmod(window, 4)
+        di, dj = self.DIRECTIONS[direction]
+        return [start + step * (di * self.board_size + dj) for step in range(5)]
+
+    def active_windows(self):
+        """Windows that hold stones"""
+        return list(self.codes)
+
+    def threat_score(self, row, col, player):
+        """How much a stone at the empty (row, col) would raise player's score and lower the opponent's"""
+        codes = self.codes
+        own_table, other_table = self.score_tables[player], self.score_tables[3 - player]
+        score = 0
+
+        for window, value in self.cell_windows[row * self.board_size + col]:
+            old_code = codes.get(window, 0)
+            new_code = old_code + player * value
+            score += own_table[new_code] - own_table[old_code] + other_table[old_code] - other_table[new_code]
+
+        return score
+
+    def _update(self, row, col, delta):
+        codes, hot_codes = self.codes, self.hot_codes
+        black_table, white_table = self.score_tables[1], self.score_tables[2]
+        black_delta = white_delta = 0
+
+        for window, value in self.cell_windows[row * self.board_size + col]:
+            old_code = codes.get(window, 0)
+            new_code = old_code + delta * value
+            if new_code:
+                codes[window] = new_code
+            else:
+                del codes[window]
+            black_delta += black_table[new_code] - black_table[old_code]
+            white_delta += white_table[new_code] - white_table[old_code]
+
+            if hot_codes[new_code] != hot_codes[old_code]:
+                if hot_codes[new_code]:
+                    self.hot_windows.add(window)
+                else:
+                    self.hot_windows.discard(window)
+
+        self.scores[1] += black_delta
+        self.scores[2] += white_delta
+
 
 def play_pvp():
     game = GomokuGame()
@@ -407,15 +2643,18 @@ def play_pve():
                 row, col = best_move
                 game.make_move(row, col)
                 print(f"AI chose position: {row} {col}")
+                ai.start_pondering()  # Think on the player's time
                 time.sleep(1)
 
+    ai.close()
     game.display_board()
     print("Game Over!")
 
 
 class GomokuGUI:
-    def __init__(self, root):
+    def __init__(self, root, game_class=GomokuGame):
         self.root = root
+        self.game_class = game_class  # GomokuGame or BitboardGomokuGame
         self.root.title("Gomoku")
         self.root.resizable(False, False)
 
@@ -450,16 +2689,26 @@ class GomokuGUI:
         self.game = None
         self.ai = None
         self.canvas = None
+        self.stone_items = {}  # (row, col) -> canvas item of the stone drawn there
+        self.drawn_moves = []  # Moves of game.move_history that are on the canvas
+        self.last_move_marker = None
         self.status_var = StringVar(value="Please select a game mode")
 
+        # The AI searches a copy of the game in a background thread, polled from the Tk event loop
+        self.search_game = None
+        self.search_thread = None
+        self.search_result = None
+        self.pending_after = None  # Tk callback id of the scheduled AI move or search poll
+
     def start_game(self):
         """Start the game"""
         self.mode_frame.pack_forget()
         self.game_frame.pack()
 
-        self.game = GomokuGame(self.board_size)
+        self.game = self.game_class(self.board_size)
         if self.game_mode.get() == 2:  # PVE mode
-            self.ai = GomokuAI(self.game, max_depth=2)
+            self.search_game = self.game_class(self.board_size)
+            self.ai = GomokuAI(self.search_game, max_depth=4, top_k=10, collect_stats=True)
             self.player = self.player_choice.get()
         else:  # PVP mode
             self.ai = None
@@ -499,9 +2748,11 @@ class GomokuGUI:
         self.update_status()
 
     def draw_board(self):
-        """Draw the board"""
+        """Draw the whole board from scratch"""
         # Clear canvas
         self.canvas.delete("all")
+        self.stone_items = {}
+        self.drawn_moves = []
 
         # Draw grid
         for i in range(self.board_size):
@@ -534,45 +2785,58 @@ class GomokuGUI:
                 fill="black"
             )
 
+        # Marker for the last move, moved from stone to stone
+        self.last_move_marker = self.canvas.create_rectangle(0, 0, 0, 0, state=tk.HIDDEN)
+
         # Draw stones
-        for i in range(self.board_size):
-            for j in range(self.board_size):
-                if self.game.board[i, j] == 1:  # Black stone
-                    self.draw_stone(j, i, "black")
-                elif self.game.board[i, j] == 2:  # White stone
-                    self.draw_stone(j, i, "white")
+        self.update_board()
+
+    def update_board(self):
+        """Bring the canvas up to date with the game: draw new stones, remove taken-back ones, move the marker"""
+        history = self.game.move_history
+
+        # Remove stones that are no longer part of the game
+        common = 0
+        for drawn, move in zip(self.drawn_moves, history):
+            if drawn != move:
+                break
+            common += 1
+        while len(self.drawn_moves) > common:
+            row, col, _ = self.drawn_moves.pop()
+            self.canvas.delete(self.stone_items.pop((row, col)))
+
+        for row, col, player in history[common:]:
+            self.stone_items[row, col] = self.draw_stone(col, row, "black" if player == 1 else "white")
+            self.drawn_moves.append((row, col, player))
+
+        if not history:
+            self.canvas.itemconfigure(self.last_move_marker, state=tk.HIDDEN)
+            return
+
+        # Note: x corresponds to column (horizontal), y corresponds to row (vertical)
+        row, col, player = history[-1]
+        canvas_x = (col + 1) * self.cell_size
+        canvas_y = (row + 1) * self.cell_size
+        mark_size = (self.cell_size // 2 - 2) // 3
+        mark_color = "white" if player == 1 else "black"
+        self.canvas.coords(self.last_move_marker, canvas_x - mark_size, canvas_y - mark_size,
+                           canvas_x + mark_size, canvas_y + mark_size)
+        self.canvas.itemconfigure(self.last_move_marker, fill=mark_color, outline=mark_color, state=tk.NORMAL)
+        self.canvas.tag_raise(self.last_move_marker)
 
     def draw_stone(self, x, y, color):
-        """Draw a stone"""
+        """Draw a stone and return its canvas item"""
         # Note: x corresponds to column (horizontal), y corresponds to row (vertical)
         canvas_x = (x + 1) * self.cell_size
         canvas_y = (y + 1) * self.cell_size
         radius = self.cell_size // 2 - 2
 
-        # Draw the stone
-        self.canvas.create_oval(
+        return self.canvas.create_oval(
             canvas_x - radius, canvas_y - radius,
             canvas_x + radius, canvas_y + radius,
             fill=color, outline="black"
         )
 
-        # Add a marker for the last move
-        last_move_x, last_move_y = None, None
-        for i in range(self.board_size):
-            for j in range(self.board_size):
-                # Find the last move
-                if self.game.board[i, j] != 0 and self.game.board[i, j] != self.game.current_player:
-                    last_move_x, last_move_y = j, i
-
-        if last_move_x is not None and last_move_y is not None and last_move_x == x and last_move_y == y:
-            mark_color = "white" if color == "black" else "black"
-            mark_size = radius // 3
-            self.canvas.create_rectangle(
-                canvas_x - mark_size, canvas_y - mark_size,
-                canvas_x + mark_size, canvas_y + mark_size,
-                fill=mark_color, outline=mark_color
-            )
-
     def on_canvas_click(self, event):
         """Handle canvas click event"""
         if self.game.game_over:
@@ -593,8 +2857,8 @@ class GomokuGUI:
         # In the logical board, y is row, x is column
         # Try to place a stone
         if self.game.make_move(y, x):
-            # Redraw the board
-            self.draw_board()
+            # Draw the new stone
+            self.update_board()
 
             # Update status
             self.update_status()
@@ -606,25 +2870,75 @@ class GomokuGUI:
 
             # If it's PVE mode and AI's turn, let AI make a move
             if self.game_mode.get() == 2 and self.game.current_player != self.player:
-                self.root.after(500, self.ai_move)  # Delay 500ms so the player can see their move
+                self.pending_after = self.root.after(500, self.ai_move)  # Delay 500ms so the player can see their move
 
     def ai_move(self):
-        """AI's move"""
-        if not self.game.game_over:
-            best_move = self.ai.get_best_move()
-            if best_move:
-                row, col = best_move
-                self.game.make_move(row, col)
+        """Start the AI's search in a background thread"""
+        self.pending_after = None
+        if self.game.game_over or self.game.current_player == self.player:
+            return
+
+        # Bring the search copy to the displayed position
+        _sync_game(self.search_game, [(row, col) for row, col, _ in self.game.move_history])
+        self.search_result = None
+        self.search_thread = threading.Thread(target=self._run_search, daemon=True)
+        self.search_thread.start()
+        self.poll_search()
+
+    def _run_search(self):
+        """Body of the search thread"""
+        try:
+            self.search_result = self.ai.get_best_move()
+        except SearchTimeout:  # Cancelled
+            self.search_result = None
+
+    def poll_search(self):
+        """Show the search progress, and play the AI's move once the search has finished"""
+        if self.search_thread.is_alive():
+            stats = self.ai.stats
+            if stats is not None and stats.depths:
+                depth = next(reversed(stats.depths))
+                self.status_var.set(f"AI thinking... depth {depth}, {stats.nodes:,} nodes")
+            else:
+                self.status_var.set("AI thinking...")
+            self.pending_after = self.root.after(100, self.poll_search)
+            return
+
+        self.pending_after = None
+        self.search_thread = None
+        best_move = self.search_result
+        if best_move:
+            row, col = best_move
+            self.game.make_move(row, col)
+
+            # Draw the new stone
+            self.update_board()
+
+            # Update status
+            self.update_status()
+
+            # Check if the game is over
+            if self.game.game_over:
+                self.show_game_result()
+            else:
+                # Think on the player's time
+                _sync_game(self.search_game, [(row, col) for row, col, _ in self.game.move_history])
+                self.ai.start_pondering()
 
-                # Redraw the board
-                self.draw_board()
+    def cancel_search(self):
+        """Stop the AI's scheduled or running search without playing its move"""
+        if self.pending_after is not None:
+            self.root.after_cancel(self.pending_after)
+            self.pending_after = None
 
-                # Update status
-                self.update_status()
+        if self.search_thread is not None:
+            self.ai.stop()
+            self.search_thread.join()
+            self.search_thread = None
+            self.ai.stop_requested = False  # In case the search had already finished
 
-                # Check if the game is over
-                if self.game.game_over:
-                    self.show_game_result()
+        if self.ai is not None:
+            self.ai.stop_pondering()
 
     def update_status(self):
         """Update status display"""
@@ -650,6 +2964,7 @@ class GomokuGUI:
 
     def restart_game(self):
         """Restart the game"""
+        self.cancel_search()
         self.game.reset_game()
         self.draw_board()
         self.update_status()
@@ -660,6 +2975,7 @@ class GomokuGUI:
 
     def back_to_menu(self):
         """Return to the main menu"""
+        self.cancel_search()
         self.game_frame.pack_forget()
         self.mode_frame.pack()
 
@@ -0,0 +1,157 @@
+import argparse
+import ast
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from gomoku import GomokuGame, GomokuAI, GameArchiveWriter
+
+
+def parse_config(text):
+    """Parse GomokuAI keyword arguments written as 'max_depth=3,top_k=10'"""
+    config = {}
+    for item in filter(None, text.split(',')):
+        key, _, value = item.partition('=')
+        try:
+            config[key.strip()] = ast.literal_eval(value.strip())
+        except (ValueError, SyntaxError):
+            config[key.strip()] = value.strip()
+    return config
+
+
+def max_opening_stones(board_size=15, spread=2):
+    """Most stones random_opening places: half the positions of its square around the center"""
+    center = board_size // 2
+    side = min(board_size - 1, center + spread) - max(0, center - spread) + 1
+    return side * side // 2
+
+
+def random_opening(rng, stones, board_size=15, spread=2):
+    """Random moves near the center that do not end the game"""
+    if not 0 <= stones <= max_opening_stones(board_size, spread):
+        raise ValueError(f"An opening needs 0 to {max_opening_stones(board_size, spread)} stones, not {stones}")
+    center = board_size // 2
+
+    # Start over whenever a stone completes a five
+    while True:
+        game = GomokuGame(board_size)
+        moves = []
+        while len(moves) < stones and not game.game_over:
+            row = center + rng.randint(-spread, spread)
+            col = center + rng.randint(-spread, spread)
+            if game.make_move(row, col):
+                moves.append((row, col))
+
+        if not game.game_over:
+            return moves
+
+
+def play_game(index, config_a, config_b, opening, board_size=15):
+    """Play one game between two AI configurations; A has black in even-numbered games"""
+    game = GomokuGame(board_size)
+    for row, col in opening:
+        game.make_move(row, col)
+
+    black, white = ('A', 'B') if index % 2 == 0 else ('B', 'A')
+    configs = {'A': config_a, 'B': config_b}
+    ais = {1: GomokuAI(game, **configs[black]), 2: GomokuAI(game, **configs[white])}
+
+    moves = []
+    think_ms = []
+    while not game.game_over:
+        start = time.perf_counter()
+        move = ais[game.current_player].get_best_move()
+        think_ms.append(round((time.perf_counter() - start) * 1000, 2))
+
+        if move is None or not game.make_move(*move):
+            break
+        moves.append(move)
+
+    winner = None
+    if game.winner:
+        winner = black if game.winner == 1 else white
+
+    return {
+        'game': index,
+        'black': black,
+        'white': white,
+        'winner': winner,
+        'opening': opening,
+        'moves': moves,
+        'move_count': game.stone_count,
+        'think_ms': think_ms,
+    }
+
+
+def run_tournament(games, config_a, config_b, workers=1, opening_stones=2, seed=0, output=sys.stdout,
+                   board_size=15, archive=None):
+    """Play the games across a pool of worker processes, writing each result as a JSON line when it finishes
+
+    With an archive path, the games are also recorded as a GameArchive, in the order they finish.
+    """
+    rng = random.Random(seed)
+    # Each opening is played twice, once with each side as black
+    openings = [random_opening(rng, opening_stones, board_size) for _ in range((games + 1) // 2)]
+
+    totals = {'A': 0, 'B': 0, None: 0}
+    start = time.perf_counter()
+
+    writer = GameArchiveWriter(archive, board_size) if archive else None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(play_game, index, config_a, config_b, openings[index // 2], board_size)
+                   for index in range(games)]
+
+        for future in as_completed(futures):
+            result = future.result()
+            totals[result['winner']] += 1
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+            if writer is not None:
+                winner = None if result['winner'] is None else 1 if result['winner'] == result['black'] else 2
+                writer.add(result['opening'] + result['moves'], winner)
+
+    if writer is not None:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'games': games,
+        'a_wins': totals['A'],
+        'b_wins': totals['B'],
+        'draws': totals[None],
+        'seconds': round(elapsed, 2),
+        'games_per_second': round(games / elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play Gomoku AI configurations against each other")
+    parser.add_argument('--games', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=1, help="worker processes")
+    parser.add_argument('--a', default='max_depth=2', help="GomokuAI arguments of player A, e.g. 'max_depth=3,top_k=10'")
+    parser.add_argument('--b', default='max_depth=2', help="GomokuAI arguments of player B")
+    parser.add_argument('--opening-stones', type=int, default=2, help="random stones placed before the AIs play")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the openings")
+    parser.add_argument('--board-size', type=int, default=15)
+    parser.add_argument('--output', help="JSONL file for the results (default: stdout)")
+    parser.add_argument('--archive', help="also record the games in a binary GameArchive file")
+    args = parser.parse_args()
+    if not 0 <= args.opening_stones <= max_opening_stones(args.board_size):
+        parser.error(f"--opening-stones must be between 0 and {max_opening_stones(args.board_size)}")
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        summary = run_tournament(args.games, parse_config(args.a), parse_config(args.b), args.workers,
+                                 args.opening_stones, args.seed, output, args.board_size, args.archive)
+    finally:
+        if args.output:
+            output.close()
+
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from analyze import _get_ai
+from gomoku import GomokuGame, _sync_game
+from selfplay import parse_config
+
+
+def search_position(board_size, config, moves, think_ms):
+    """Best move for the side to move after the given moves, searched in a worker process"""
+    ai = _get_ai(board_size, config)
+    _sync_game(ai.game, moves)
+    ai.think_ms = think_ms
+    move = ai.get_best_move()
+    return {'move': list(move) if move else None, 'score': ai.last_score, 'depth': ai.completed_depth}
+
+
+class ServerBusy(Exception):
+    """Raised when a request cannot be queued; the client may retry later"""
+
+
+class SearchJob:
+    def __init__(self, board_size, moves, deadline, future):
+        self.board_size = board_size
+        self.moves = moves
+        self.deadline = deadline  # Event loop time by which the answer is due
+        self.future = future
+
+
+class EngineScheduler:
+    """Runs searches on a bounded process pool, taking queued requests round-robin across sessions
+
+    Each session has its own queue, and a free worker always takes the next request of the next
+    session in turn, so a session with many requests cannot hold up the others. Requests beyond
+    max_queue in total, or max_session_queue for one session, are refused with ServerBusy.
+    """
+
+    def __init__(self, workers, ai_config, max_queue=256, max_session_queue=4):
+        self.workers = workers
+        self.ai_config = ai_config
+        self.max_queue = max_queue
+        self.max_session_queue = max_session_queue
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.closed = False
+
+        self.queues = {}  # Session id -> deque of SearchJob
+        self.turns = deque()  # Ids of the sessions with queued jobs, in the order they are served
+        self.queued = 0
+        self.running = 0
+        self.searches = 0  # Searches finished since the start
+        self._slots = asyncio.Semaphore(workers)
+        self._ready = asyncio.Event()
+        self._tasks = set()
+        self._dispatcher = None
+
+    def start(self):
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def close(self):
+        self.closed = True
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+        # Answer the jobs that will never run
+        for queue in self.queues.values():
+            for job in queue:
+                if not job.future.done():
+                    job.future.set_exception(ServerBusy("server is shutting down"))
+        self.queues.clear()
+        self.turns.clear()
+        self.queued = 0
+
+    async def search(self, session_id, board_size, moves, budget_ms):
+        """Best move after the given moves, answered within about budget_ms including the time in the queue"""
+        if self.closed:
+            raise ServerBusy("server is shutting down")
+        queue = self.queues.get(session_id)
+        if self.queued >= self.max_queue:
+            raise ServerBusy("server overloaded, retry later")
+        if queue is not None and len(queue) >= self.max_session_queue:
+            raise ServerBusy("too many requests queued for this session")
+
+        loop = asyncio.get_running_loop()
+        job = SearchJob(board_size, list(moves), loop.time() + budget_ms / 1000, loop.create_future())
+        if queue is None:
+            queue = self.queues[session_id] = deque()
+            self.turns.append(session_id)
+        queue.append(job)
+        self.queued += 1
+        self._ready.set()
+        return await job.future
+
+    async def _dispatch(self):
+        while True:
+            await self._slots.acquire()
+            while not self.turns:
+                self._ready.clear()
+                await self._ready.wait()
+
+            session_id = self.turns.popleft()
+            queue = self.queues[session_id]
+            job = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self.turns.append(session_id)
+            else:
+                del self.queues[session_id]
+
+            # The client went away while the job was queued
+            if job.future.done():
+                self._slots.release()
+                continue
+
+            task = asyncio.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job):
+        loop = asyncio.get_running_loop()
+        # Leave a margin for passing the job to the worker and the result back
+        remaining = int((job.deadline - loop.time()) * 1000)
+        think_ms = max(10, remaining - max(50, remaining // 5))
+
+        self.running += 1
+        try:
+            result = await loop.run_in_executor(self.pool, search_position, job.board_size, self.ai_config,
+                                                job.moves, think_ms)
+        except Exception as error:
+            if isinstance(error, BrokenProcessPool) and not self.closed:
+                # A worker died; later searches get a new pool
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            if not job.future.done():
+                job.future.set_exception(error)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self.running -= 1
+            self.searches += 1
+            self._slots.release()
+
+
+class Session:
+    """One game against the AI"""
+
+    def __init__(self, session_id, board_size, ai_player):
+        self.id = session_id
+        self.game = GomokuGame(board_size)
+        self.ai_player = ai_player
+        self.thinking = False  # The AI's reply is being searched; the game cannot change meanwhile
+        self.last_used = time.monotonic()
+
+    def moves(self):
+        return [(row, col) for row, col, _ in self.game.move_history]
+
+    def state(self):
+        return {
+            'session': self.id,
+            'board_size': self.game.board_size,
+            'ai_player': self.ai_player,
+            'current_player': self.game.current_player,
+            'moves': [list(move) for move in self.moves()],
+            'game_over': self.game.game_over,
+            'winner': self.game.winner,
+        }
+
+
+class GameServer:
+    """Many games against the AI served over line-delimited JSON
+
+    Each request is a JSON object on one line with an 'op' and optionally an 'id', which is
+    copied to the response. Requests of a connection are handled concurrently and answered as
+    they finish, so clients should match responses by id. A connection has at most max_inflight
+    requests in progress; further lines are not read until one finishes.
+
+    Ops: new (board_size, ai_player), move (session, row, col, time_ms), hint (session, time_ms),
+    undo (session, count), state (session), close (session) and stats.
+    """
+
+    def __init__(self, workers=1, ai_config=None, think_ms=1000, max_think_ms=10000, max_sessions=1000,
+                 max_queue=256, max_inflight=8, session_timeout=3600):
+        self.scheduler = EngineScheduler(workers, ai_config or {}, max_queue)
+        self.think_ms = think_ms  # Default time budget of a request
+        self.max_think_ms = max_think_ms
+        self.max_sessions = max_sessions
+        self.max_inflight = max_inflight
+        self.session_timeout = session_timeout  # Seconds after which an unused session is dropped
+        self.sessions = {}
+        self.connections = 0
+        self._reaper = None
+
+        self.ops = {
+            'new': self.new,
+            'move': self.move,
+            'hint': self.hint,
+            'undo': self.undo,
+            'state': self.state,
+            'close': self.close_session,
+            'stats': self.stats,
+        }
+
+    async def start(self):
+        self.scheduler.start()
+        self._reaper = asyncio.create_task(self._reap_sessions())
+
+    async def close(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+        await self.scheduler.close()
+
+    async def _reap_sessions(self):
+        while True:
+            await asyncio.sleep(min(60, self.session_timeout))
+            now = time.monotonic()
+            for session_id, session in list(self.sessions.items()):
+                if not session.thinking and now - session.last_used > self.session_timeout:
+                    del self.sessions[session_id]
+
+    async def handle_connection(self, reader, writer):
+        self.connections += 1
+        inflight = asyncio.Semaphore(self.max_inflight)
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(line):
+            try:
+                response = await self.handle(line)
+                async with write_lock:
+                    writer.write((json.dumps(response) + "\n").encode())
+                    await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                inflight.release()
+
+        try:
+            while True:
+                await inflight.acquire()
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+                task = asyncio.create_task(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            # Finish the requests already read even if the client is gone: sessions outlive connections
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def handle(self, line):
+        """Response to one request line"""
+        request = {}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            handler = self.ops.get(request.get('op'))
+            if handler is None:
+                raise ValueError(f"unknown op {request.get('op')!r}")
+            response = await handler(request)
+        except ServerBusy as error:
+            response = {'error': str(error), 'retry': True}
+        except (ValueError, KeyError, TypeError) as error:
+            response = {'error': str(error)}
+        except Exception as error:
+            # Anything else is the server's fault, such as a broken worker pool; answer anyway
+            traceback.print_exc()
+            response = {'error': f"internal error: {type(error).__name__}: {error}"}
+
+        if isinstance(request, dict) and 'id' in request:
+            response = {'id': request['id'], **response}
+        return response
+
+    def _session(self, request):
+        session = self.sessions.get(request['session'])
+        if session is None:
+            raise ValueError(f"unknown session {request['session']!r}")
+        session.last_used = time.monotonic()
+        return session
+
+    def _budget(self, request):
+        return max(10, min(int(request.get('time_ms', self.think_ms)), self.max_think_ms))
+
+    async def _ai_move(self, session, budget_ms):
+        """Search and play the AI's move; returns the search result"""
+        session.thinking = True
+        try:
+            result = await self.scheduler.search(session.id, session.game.board_size, session.moves(), budget_ms)
+        finally:
+            session.thinking = False
+        if result['move'] is not None:
+            session.game.make_move(*result['move'])
+        return result
+
+    async def new(self, request):
+        """Start a game; the AI moves first when it plays black"""
+        if len(self.sessions) >= self.max_sessions:
+            raise ServerBusy("too many sessions")
+        board_size = int(request.get('board_size', 15))
+        ai_player = int(request.get('ai_player', 2))
+        if not 5 <= board_size <= 25:
+            raise ValueError(f"unsupported board size {board_size}")
+        if ai_player not in (1, 2):
+            raise ValueError("ai_player must be 1 or 2")
+
+        session = Session(uuid.uuid4().hex, board_size, ai_player)
+        self.sessions[session.id] = session
+        response = {}
+        if ai_player == 1:
+            try:
+                response = await self._ai_move(session, self._budget(request))
+            except Exception:
+                del self.sessions[session.id]
+                raise
+        return {**session.state(), **response}
+
+    async def move(self, request):
+        """Play the player's move and answer with the AI's"""
+        session = self._session(request)
+        game = session.game
+        if session.thinking:
+            raise ValueError("the AI is still thinking")
+        if game.game_over:
+            raise ValueError("the game is over")
+        if game.current_player == session.ai_player:
+            raise ValueError("it is the AI's turn")
+        row, col = int(request['row']), int(request['col'])
+        if not (0 <= row < game.board_size and 0 <= col < game.board_size) or not game.make_move(row, col):
+            raise ValueError(f"invalid move {row},{col}")
+
+        response = {}
+        if not game.game_over:
+            try:
+                response = await self._ai_move(session, self._budget(request))
+            except Exception:
+                # Keep the game as it was before the request
+                game.undo_move()
+                raise
+        return {**session.state(), **response}
+
+    async def hint(self, request):
+        """Best move for the side to move, without playing it"""
+        session = self._session(request)
+        if session.game.game_over:
+            raise ValueError("the game is over")
+        return await self.scheduler.search(session.id, session.game.board_size, session.moves(),
+                                           self._budget(request))
+
+    async def undo(self, request):
+        """Take back count moves (default: back to the player's previous turn)"""
+        session = self._session(request)
+        if session.thinking:
+            raise ValueError("the AI is still thinking")
+        game = session.game
+        default = 1 if game.current_player == session.ai_player else 2
+        count = min(int(request.get('count', default)), len(game.move_history))
+        for _ in range(count):
+            game.undo_move()
+        return session.state()
+
+    async def state(self, request):
+        return self._session(request).state()
+
+    async def close_session(self, request):
+        session = self._session(request)
+        if session.thinking:
+            raise ValueError("the AI is still thinking")
+        del self.sessions[session.id]
+        return {'closed': session.id}
+
+    async def stats(self, request):
+        return {
+            'sessions': len(self.sessions),
+            'connections': self.connections,
+            'workers': self.scheduler.workers,
+            'queued': self.scheduler.queued,
+            'running': self.scheduler.running,
+            'searches': self.scheduler.searches,
+        }
+
+
+async def serve(args):
+    server = GameServer(args.workers, parse_config(args.ai), args.think_ms, args.max_think_ms, args.max_sessions,
+                        args.max_queue, args.max_inflight, args.session_timeout)
+    await server.start()
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle_connection, path=args.unix)
+        where = args.unix
+    else:
+        listener = await asyncio.start_server(server.handle_connection, args.host, args.port)
+        where = f"{args.host}:{args.port}"
+
+    print(f"Serving games on {where} with {args.workers} engine workers", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve many games against the AI over line-delimited JSON")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7878)
+    parser.add_argument('--unix', help="listen on this Unix socket path instead of TCP")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="engine worker processes")
+    parser.add_argument('--ai', default='', help="GomokuAI arguments, e.g. 'top_k=12,search=pvs'")
+    parser.add_argument('--think-ms', type=int, default=1000, help="default time budget of a move request")
+    parser.add_argument('--max-think-ms', type=int, default=10000, help="largest time budget a request may ask for")
+    parser.add_argument('--max-sessions', type=int, default=1000)
+    parser.add_argument('--max-queue', type=int, default=256, help="searches queued before requests are refused")
+    parser.add_argument('--max-inflight', type=int, default=8, help="requests in progress per connection")
+    parser.add_argument('--session-timeout', type=int, default=3600, help="seconds before an unused game is dropped")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
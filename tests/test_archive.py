@@ -0,0 +1,94 @@
+import struct
+
+import numpy as np
+import pytest
+
+from gomoku import GomokuGame, BitboardGomokuGame, GameArchive, GameArchiveWriter
+
+WIN = [(7, 3), (8, 3), (7, 4), (8, 4), (7, 5), (8, 5), (7, 6), (8, 6), (7, 7)]
+OPEN = [(7, 7), (6, 8), (8, 8), (5, 9), (6, 6)]
+GAMES = [(WIN, 1), ([], None), (OPEN, None), ([(0, 0), (14, 14), (0, 14)], 0)]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = tmp_path / 'games.gmk'
+    assert GameArchive.write(path, 15, GAMES) == len(GAMES)
+    return GameArchive(path)
+
+
+def test_layout(archive):
+    data = archive.path.read_bytes()
+    total_moves = sum(len(moves) for moves, _ in GAMES)
+    assert struct.unpack('<4sHHQQ', data[:24]) == (b'GMKR', 1, 15, len(GAMES), total_moves)
+
+    # The offset index starts on an 8-byte boundary after the moves
+    index = 24 + 2 * total_moves
+    index += -index % 8
+    assert data[24 + 2 * total_moves:index] == bytes(index - 24 - 2 * total_moves)
+    offsets = struct.unpack(f'<{len(GAMES) + 1}Q', data[index:index + 8 * (len(GAMES) + 1)])
+    assert offsets == (0, 9, 9, 14, 17)
+    assert list(data[index + 8 * (len(GAMES) + 1):]) == [1, 0, 0, 0]
+    assert len(data) == index + 9 * len(GAMES) + 8
+
+
+def test_moves_and_replay(archive):
+    assert len(archive) == len(GAMES) and archive.board_size == 15
+    assert archive.winners.tolist() == [1, 0, 0, 0]
+    for index, (moves, _) in enumerate(GAMES):
+        assert archive.moves(index).tolist() == [list(move) for move in moves]
+        assert archive.moves(index, 2).tolist() == [list(move) for move in moves[:2]]
+    assert archive.moves(1).shape == (0, 2)
+    with pytest.raises(IndexError):
+        archive.moves(len(GAMES))
+
+    game = archive.replay(0, game_class=BitboardGomokuGame)
+    assert game.game_over and game.winner == 1
+    assert archive.replay(0, 4).stone_count == 4
+    assert archive.replay(1).stone_count == 0
+
+
+def test_boards_agree_with_make_move(archive):
+    for index, (moves, _) in enumerate(GAMES):
+        positions = archive.positions(index)
+        assert positions.shape == (len(moves) + 1, 15, 15)
+
+        game = GomokuGame(15)
+        assert not positions[0].any()
+        for ply, (row, col) in enumerate(moves, 1):
+            game.make_move(row, col)
+            assert np.array_equal(positions[ply], game.board)
+
+    for ply in (0, 3, 6, 20):
+        boards = archive.boards_at(ply)
+        for index in range(len(GAMES)):
+            assert np.array_equal(boards[index], archive.replay(index, ply).board)
+    assert np.array_equal(archive.boards_at(5, [2, 0]), archive.boards_at(5)[[2, 0]])
+
+
+def test_writer_appends_games(tmp_path):
+    path = tmp_path / 'games.gmk'
+    game = GomokuGame(15)
+    for row, col in WIN:
+        game.make_move(row, col)
+    with GameArchiveWriter(path, 15) as writer:
+        writer.add_game(game)
+        writer.add(OPEN)
+
+    archive = GameArchive(path)
+    assert len(archive) == 2
+    assert archive.winners.tolist() == [1, 0]
+    assert archive.moves(1).tolist() == [list(move) for move in OPEN]
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'games.gmk'
+    GameArchive.write(path, 15, GAMES)
+    data = bytearray(path.read_bytes())
+    data[:4] = b'XXXX'
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        GameArchive(path)
+
+    with pytest.raises(ValueError):
+        GameArchiveWriter(tmp_path / 'big.gmk', 257)
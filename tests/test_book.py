@@ -0,0 +1,80 @@
+import struct
+
+import pytest
+
+from gomoku import GomokuGame, GomokuAI, OpeningBook
+
+SIZE = 15
+
+
+def write_book(path, positions, max_stones=3):
+    """Write a book of {moves: (book move, score)} the way build_book.py does"""
+    entries = {}
+    for moves, ((row, col), score) in positions.items():
+        stones = [(r, c, 1 + index % 2) for index, (r, c) in enumerate(moves)]
+        key, symmetry = OpeningBook.canonical_key(SIZE, stones)
+        forward, _ = OpeningBook.symmetries(SIZE)[symmetry]
+        entries[key] = (forward[row * SIZE + col], score)
+    OpeningBook.write(path, SIZE, entries, max_stones)
+    return OpeningBook(path)
+
+
+def played(moves):
+    game = GomokuGame(SIZE)
+    for row, col in moves:
+        game.make_move(row, col)
+    return game
+
+
+def transformed(symmetry, row, col):
+    forward, _ = OpeningBook.symmetries(SIZE)[symmetry]
+    return divmod(forward[row * SIZE + col], SIZE)
+
+
+def test_reflection_finds_the_same_entry(tmp_path):
+    book = write_book(tmp_path / 'book.bin', {((7, 7), (6, 6)): ((5, 5), 12.5)})
+    assert book.lookup(played([(7, 7), (6, 6)])) == (5, 5, 12.5)
+    # Mirrored through the centre, the stored move maps back to the other side
+    assert book.lookup(played([(7, 7), (8, 8)])) == (9, 9, 12.5)
+
+
+def test_every_symmetry_maps_the_move_back(tmp_path):
+    # No symmetry maps this position onto itself, so each orientation has exactly one right answer
+    moves = ((7, 7), (6, 6), (7, 9))
+    book = write_book(tmp_path / 'book.bin', {moves: ((8, 10), -3.0)})
+
+    for symmetry in range(8):
+        game = played([transformed(symmetry, row, col) for row, col in moves])
+        assert book.lookup(game) == (*transformed(symmetry, 8, 10), -3.0)
+
+
+def test_lookup_misses(tmp_path):
+    book = write_book(tmp_path / 'book.bin', {((7, 7),): ((6, 6), 0.0), ((7, 7), (6, 7)): ((7, 6), 0.0)},
+                      max_stones=1)
+    assert book.lookup(played([(7, 7)])) == (6, 6, 0.0)
+    assert book.lookup(played([(7, 8)])) is None
+    # Beyond max_stones, or the game is on another board
+    assert book.lookup(played([(7, 7), (6, 7)])) is None
+    game = GomokuGame(19)
+    game.make_move(7, 7)
+    assert book.lookup(game) is None
+
+
+def test_ai_plays_the_book_move(tmp_path):
+    path = tmp_path / 'book.bin'
+    write_book(path, {((7, 7),): ((6, 8), 4.0)})
+    ai = GomokuAI(played([(7, 7)]), max_depth=1, book=path, collect_stats=True)
+    assert ai.get_best_move() == (6, 8)
+    assert ai.stats.source == 'book'
+    assert ai.last_score == 4.0 and ai.completed_depth == 0
+
+
+@pytest.mark.parametrize('header', [(b'GMKR', 1), (b'GMKB', 2)])
+def test_rejects_other_files(tmp_path, header):
+    path = tmp_path / 'book.bin'
+    write_book(path, {((7, 7),): ((6, 6), 0.0)})
+    data = bytearray(path.read_bytes())
+    data[:6] = struct.pack('<4sH', *header)
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        OpeningBook(path)
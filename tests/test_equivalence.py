@@ -0,0 +1,104 @@
+import random
+
+import numpy as np
+import pytest
+
+from benchmark import CORPUS, load_position
+from gomoku import GomokuGame, BitboardGomokuGame, SparseGomokuGame, GomokuAI, PATTERN_SCORES
+
+
+def full_scan_evaluate(board, whose_turn):
+    """The original evaluation: every window of the board classified with _check_pattern, and the
+    separation from every stone to every opponent stone"""
+    size = len(board)
+    scores = [None, 0, 0]
+    for row in range(size):
+        for col in range(size):
+            for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                if not (0 <= row + 4 * dr < size and 0 <= col + 4 * dc < size):
+                    continue
+                line = [int(board[row + step * dr, col + step * dc]) for step in range(5)]
+                for player in (1, 2):
+                    pattern = GomokuAI._check_pattern(line, player)
+                    if pattern in PATTERN_SCORES:
+                        scores[player] += PATTERN_SCORES[pattern]
+
+    mine = list(zip(*np.nonzero(board == whose_turn)))
+    theirs = list(zip(*np.nonzero(board == 3 - whose_turn)))
+    separation = 0
+    if mine and theirs:
+        total = sum(min(abs(r - s) + abs(c - t) for s, t in theirs) for r, c in mine)
+        separation = total / len(mine) * 10
+
+    return GomokuAI._combine_scores(scores[whose_turn], scores[3 - whose_turn], separation)
+
+
+def random_positions(game, rng, moves=30):
+    """Play random candidate moves, taking some back, and yield after each change"""
+    for _ in range(moves):
+        if game.game_over or rng.random() < 0.2:
+            if game.undo_move():
+                yield
+            continue
+        game.make_move(*rng.choice(game.get_valid_moves()))
+        yield
+
+
+@pytest.mark.parametrize('game_class', [GomokuGame, BitboardGomokuGame, SparseGomokuGame])
+def test_incremental_evaluation_matches_full_scan(game_class):
+    rng = random.Random(7)
+    for _ in range(4):
+        game = game_class(11)
+        ai = GomokuAI(game)
+        for _ in random_positions(game, rng):
+            board = np.array(game.board)
+            for player in (1, 2):
+                expected = full_scan_evaluate(board, player)
+                assert ai.evaluate_position(player) == pytest.approx(expected, abs=1e-9)
+                assert ai.evaluate_board(player, board) == pytest.approx(expected, abs=1e-9)
+
+
+def test_distance_field_separation_matches_full_scan():
+    rng = random.Random(3)
+    game = GomokuGame(15)
+    for _ in random_positions(game, rng, 60):
+        board = np.array(game.board)
+        for player in (1, 2):
+            mine = list(zip(*np.nonzero(board == player)))
+            theirs = list(zip(*np.nonzero(board == 3 - player)))
+            expected = 0
+            if mine and theirs:
+                expected = sum(min(abs(r - s) + abs(c - t) for s, t in theirs) for r, c in mine) / len(mine) * 10
+            assert game.distance_field.separation(player) == pytest.approx(expected, abs=1e-9)
+
+
+POSITIONS = ['opening-2', 'middle-1', 'tactical-2']
+
+
+@pytest.mark.parametrize('name', POSITIONS)
+def test_pvs_matches_alphabeta(name):
+    results = []
+    for search in ('alphabeta', 'pvs'):
+        ai = GomokuAI(load_position(CORPUS[name]), max_depth=3, threat_search=False, search=search)
+        results.append((ai.get_best_move(), ai.last_score))
+    assert results[0] == results[1]
+
+
+def test_parallel_search_matches_serial():
+    serial, parallel = [], []
+    for name in POSITIONS:
+        ai = GomokuAI(load_position(CORPUS[name]), max_depth=2, threat_search=False)
+        serial.append((ai.get_best_move(), ai.last_score))
+
+    game = GomokuGame()
+    ai = GomokuAI(game, max_depth=2, threat_search=False, workers=2)
+    try:
+        for name in POSITIONS:
+            game.reset_game()
+            for row, col in CORPUS[name]:
+                game.make_move(row, col)
+            parallel.append((ai.get_best_move(), ai.last_score))
+    finally:
+        ai.close()
+
+    assert parallel == serial
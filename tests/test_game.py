@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from gomoku import GomokuGame, BitboardGomokuGame, SparseGomokuGame, GomokuAI
+
+
+def played(game_class, moves, board_size=15):
+    game = game_class(board_size)
+    for row, col in moves:
+        assert game.make_move(row, col)
+    return game
+
+
+@pytest.mark.parametrize('game_class', [GomokuGame, BitboardGomokuGame, SparseGomokuGame])
+def test_assigning_board_rebuilds_trackers(game_class):
+    board = np.zeros((15, 15), dtype=int)
+    board[7, 7] = 1
+    board[7, 8] = 2
+    board[6, 6] = 1
+
+    game = game_class(15)
+    game.board = board
+    reference = played(game_class, [(7, 7), (7, 8), (6, 6)])
+    # Assigning the board keeps the side to move
+    reference.current_player = 1
+    reference.hash ^= reference.zobrist.side
+
+    assert sorted(game.get_valid_moves()) == sorted(reference.get_valid_moves())
+    assert (7, 7) not in game.get_valid_moves()
+    assert game.hash == reference.hash
+    assert game.stone_count == 3
+    assert game.patterns.scores[1:] == reference.patterns.scores[1:]
+    assert np.array_equal(game.board, board)
+
+    move = GomokuAI(game, max_depth=2).get_best_move()
+    assert board[move] == 0
+    assert move == GomokuAI(reference, max_depth=2).get_best_move()
+
+
+def test_set_board_finds_a_finished_game():
+    board = np.zeros((15, 15), dtype=int)
+    board[3, 2:7] = 2
+    board[10, 2:6] = 1
+    board[11, 2] = 1
+
+    game = GomokuGame(15)
+    game.set_board(board, current_player=1)
+    assert game.game_over and game.winner == 2
+    assert not game.make_move(0, 0)
+
+    # The stones can be taken back one by one
+    while game.undo_move():
+        pass
+    assert game.stone_count == 0 and not np.any(game.board)
+
+
+def test_set_board_rejects_other_sizes():
+    with pytest.raises(ValueError):
+        GomokuGame(15).set_board(np.zeros((19, 19), dtype=int))
@@ -0,0 +1,85 @@
+import io
+
+from gomocup import GomocupEngine, MIN_THINK_MS
+
+
+def run(engine, *lines):
+    """Feed lines to the engine and return what it answered"""
+    start = engine.output.tell()
+    for line in lines:
+        assert engine.handle(line)
+    return engine.output.getvalue()[start:].splitlines()
+
+
+def test_commands_before_start():
+    engine = GomocupEngine(io.StringIO())
+    assert run(engine, 'ABOUT', 'TURN 7,7', 'FOO') == [
+        'name="Gomuku", version="1.0", author="Porsugu", country="Unknown"',
+        'ERROR no game started',
+        'UNKNOWN FOO',
+    ]
+    assert run(engine, 'START 4', 'START x') == ['ERROR unsupported board size 4', 'ERROR invalid board size x']
+
+
+def test_board_completes_a_five_in_protocol_coordinates():
+    engine = GomocupEngine(io.StringIO())
+    assert run(engine, 'START 15', 'INFO timeout_turn 0') == ['OK']
+    assert engine.think_ms() == MIN_THINK_MS
+
+    # Ours at column x=5, rows y=3..6, one of them marked as a winning-line stone; the top end is blocked
+    output = run(engine, 'BOARD', '5,3,1', '5,4,1', '5,5,3', '5,6,1', '5,2,2', '0,0,2', '14,0,2', '0,14,2', 'DONE')
+    assert output[0].startswith('MESSAGE depth 0 score None')
+    assert output[1] == '5,7'
+
+    # Equal stone counts: we played black, stored as row, col
+    game = engine.game
+    assert [game.board[row, 5] for row in range(2, 8)] == [2, 1, 1, 1, 1, 1]
+    assert game.game_over and game.winner == 1
+
+    assert run(engine, 'TAKEBACK 7,5', 'TAKEBACK 5,7') == ['ERROR cannot take back 7,5', 'OK']
+    assert game.stone_count == 8 and game.current_player == 1 and not game.game_over
+
+
+def test_board_guesses_white_and_rejects_impossible_counts():
+    engine = GomocupEngine(io.StringIO())
+    run(engine, 'START 15', 'INFO timeout_turn 0')
+
+    output = run(engine, 'BOARD', '7,7,2', '9,9,1', '0,1,2', 'DONE')
+    assert len(output) == 2
+    assert engine.game.board[9, 9] == 2 and engine.game.board[7, 7] == 1 and engine.game.board[1, 0] == 1
+    assert engine.game.stone_count == 4
+
+    assert run(engine, 'BOARD', '1,1,1', '2,2,1', '3,3,1', '4,4,2', 'DONE') == [
+        'ERROR stone counts do not allow our turn']
+    assert run(engine, 'BOARD', '1,1', 'DONE') == ['ERROR invalid stone 1,1']
+    assert run(engine, 'BOARD', '1,1,1', '1,1,2', 'DONE') == ['ERROR invalid position at 1,1']
+
+
+def test_begin_and_turn():
+    engine = GomocupEngine(io.StringIO())
+    run(engine, 'START 15', 'INFO timeout_turn 0')
+
+    x, y = map(int, run(engine, 'BEGIN')[-1].split(','))
+    assert engine.game.board[y, x] == 1
+
+    opponent = (x + 2) % 15, y
+    output = run(engine, f'TURN {opponent[0]},{opponent[1]}')
+    assert engine.game.board[opponent[1], opponent[0]] == 2
+    x, y = map(int, output[-1].split(','))
+    assert engine.game.board[y, x] == 1 and engine.game.stone_count == 3
+
+    assert run(engine, 'TURN 15,0', f'TURN {x},{y}') == ['ERROR invalid move 15,0', f'ERROR invalid move {x},{y}']
+    assert run(engine, 'RESTART') == ['OK'] and engine.game.stone_count == 0
+    assert not engine.handle('END')
+
+
+def test_think_ms_budget():
+    engine = GomocupEngine(io.StringIO())
+    run(engine, 'START 15')
+    assert engine.think_ms() == 30000 - 6000
+
+    run(engine, 'INFO timeout_match 100000', 'INFO time_left 4000', 'INFO foo bar')
+    assert engine.think_ms() == MIN_THINK_MS  # 4000 ms over 40 moves leaves nothing after the margin
+
+    run(engine, 'INFO time_left 400000', 'INFO timeout_turn 5000')
+    assert engine.think_ms() == 5000 - 1000
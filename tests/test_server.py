@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+import pytest
+
+from server import EngineScheduler, GameServer, ServerBusy
+
+CONFIG = {'max_depth': 1, 'threat_search': False}
+
+
+def test_scheduler_takes_sessions_round_robin():
+    async def scenario():
+        scheduler = EngineScheduler(1, CONFIG)
+        scheduler.start()
+        finished = []
+
+        async def search(session_id, moves):
+            await scheduler.search(session_id, 15, moves, 500)
+            finished.append(session_id)
+
+        try:
+            # Session a queues three searches before b's one; b does not wait for all of them
+            await asyncio.gather(*(search(session_id, [(7, 7)]) for session_id in ('a', 'a', 'a', 'b')))
+        finally:
+            await scheduler.close()
+        return finished, scheduler.searches
+
+    finished, searches = asyncio.run(scenario())
+    assert finished == ['a', 'b', 'a', 'a']
+    assert searches == 4
+
+
+def test_scheduler_refuses_requests_beyond_its_queues():
+    async def scenario():
+        scheduler = EngineScheduler(1, CONFIG, max_queue=3, max_session_queue=2)
+        scheduler.start()
+        try:
+            requests = [scheduler.search(session_id, 15, [], 500) for session_id in ('a', 'a', 'a', 'b', 'c', 'd')]
+            return await asyncio.gather(*requests, return_exceptions=True)
+        finally:
+            await scheduler.close()
+
+    results = asyncio.run(scenario())
+    errors = [str(result) if isinstance(result, ServerBusy) else None for result in results]
+    assert errors == [None, None, "too many requests queued for this session", None,
+                      "server overloaded, retry later", "server overloaded, retry later"]
+    assert all(results[index]['move'] is not None for index in (0, 1, 3))
+
+
+def test_scheduler_refuses_requests_after_close():
+    async def scenario():
+        scheduler = EngineScheduler(1, CONFIG)
+        scheduler.start()
+        await scheduler.close()
+        await scheduler.search('a', 15, [], 500)
+
+    with pytest.raises(ServerBusy):
+        asyncio.run(scenario())
+
+
+def test_game_ops_over_a_connection():
+    async def scenario():
+        server = GameServer(workers=1, ai_config=CONFIG, think_ms=100)
+        await server.start()
+        listener = await asyncio.start_server(server.handle_connection, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+
+        async def request(**fields):
+            writer.write((json.dumps(fields) + "\n").encode())
+            await writer.drain()
+            return json.loads(await reader.readline())
+
+        try:
+            responses = [await request(id=1, op='new', ai_player=2)]
+            session = responses[0]['session']
+            responses.append(await request(id=2, op='move', session=session, row=7, col=7))
+            responses.append(await request(id=3, op='move', session=session, row=7, col=7))
+            responses.append(await request(op='undo', session=session))
+            responses.append(await request(op='new', ai_player=1, board_size=9))
+            responses.append(await request(op='state', session='missing'))
+            responses.append(await request(op='fly'))
+            responses.append(await request(op='stats'))
+        finally:
+            writer.close()
+            listener.close()
+            await server.close()
+        return responses
+
+    new, move, occupied, undo, black, missing, unknown, stats = asyncio.run(scenario())
+
+    assert new['id'] == 1 and new['moves'] == [] and new['current_player'] == 1
+
+    assert move['id'] == 2
+    assert move['moves'][0] == [7, 7] and move['moves'][1] == move['move']
+    assert move['current_player'] == 1 and not move['game_over']
+
+    assert occupied == {'id': 3, 'error': "invalid move 7,7"}
+
+    # Undo goes back to the player's previous turn
+    assert undo['moves'] == [] and undo['current_player'] == 1
+
+    assert black['board_size'] == 9 and black['ai_player'] == 1
+    assert black['moves'] == [black['move']] and black['current_player'] == 2
+
+    assert missing == {'error': "unknown session 'missing'"}
+    assert unknown == {'error': "unknown op 'fly'"}
+    assert stats['sessions'] == 2 and stats['searches'] == 2 and stats['queued'] == 0
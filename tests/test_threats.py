@@ -0,0 +1,84 @@
+import numpy as np
+
+from gomoku import GomokuGame, GomokuAI, ThreatSolver
+
+
+def test_threat_move_reports_no_search_depth():
+    game = GomokuGame(15)
+    ai = GomokuAI(game, max_depth=1, collect_stats=True)
+    game.make_move(7, 7)
+    ai.get_best_move()
+    assert ai.completed_depth == 1
+
+    # Black completes the row at (7, 6); no search produced the move
+    game.reset_game()
+    for row, col in [(7, 2), (0, 0), (7, 3), (0, 2), (7, 4), (0, 4), (7, 5), (0, 6)]:
+        game.make_move(row, col)
+    assert ai.get_best_move() in ((7, 1), (7, 6))
+    assert ai.stats.source == 'threat'
+    assert ai.completed_depth == 0
+    assert ai.last_score is None
+
+
+def position(black, white):
+    """Black to move with the given stones"""
+    board = np.zeros((15, 15), dtype=int)
+    for stones, player in ((black, 1), (white, 2)):
+        for row, col in stones:
+            board[row, col] = player
+    game = GomokuGame(15)
+    game.set_board(board, current_player=1)
+    return game
+
+
+CORNERS = [(0, 0), (0, 14), (14, 0), (14, 14)]
+
+
+def test_immediate_five():
+    game = position([(7, 3), (7, 4), (7, 5), (7, 6)], [(6, 3), (6, 4), (6, 5), (7, 7)])
+    solver = ThreatSolver(game)
+    assert solver.five_moves(1) == {7 * 15 + 2}
+    assert solver.find_win(1) == [(7, 2)]
+    assert GomokuAI(game).get_best_move() == (7, 2)
+
+    # White's four is blocked when black has nothing faster
+    game = position([(7, 3), (7, 4), (9, 9)], [(6, 3), (6, 4), (6, 5), (6, 6)])
+    assert GomokuAI(game).get_best_move() in ((6, 2), (6, 7))
+
+
+def test_four_three_found_by_vcf():
+    # (7, 8) makes a four on the row, blocked at (7, 4), and an open three on column 8
+    game = position([(7, 5), (7, 6), (7, 7), (5, 8), (6, 8)], [(7, 4)] + CORNERS)
+    history = list(game.move_history)
+
+    solver = ThreatSolver(game, use_threes=False)
+    line = solver.find_win(1)
+    assert line[:2] == [(7, 8), (7, 9)]
+    assert line[2] in ((4, 8), (8, 8))
+    assert not solver.exhausted
+    assert game.move_history == history and game.current_player == 1
+
+    # White has no forcing line of its own; searching for it leaves black to move
+    assert solver.find_win(2) is None
+    assert game.move_history == history and game.current_player == 1
+
+
+def test_find_win_restores_the_game_when_out_of_budget():
+    game = position([(7, 5), (7, 6), (7, 7), (5, 8), (6, 8)], [(7, 4)] + CORNERS)
+    history, stone_count, board_hash = list(game.move_history), game.stone_count, game.hash
+
+    solver = ThreatSolver(game, node_budget=1, use_threes=False)
+    assert solver.find_win(1) is None
+    assert solver.exhausted
+    assert game.move_history == history and game.current_player == 1
+    assert game.stone_count == stone_count and game.hash == board_hash
+
+
+def test_defence_against_an_open_three():
+    game = position([(2, 2), (12, 3), (3, 12)], [(7, 6), (7, 7), (7, 8)])
+    assert ThreatSolver(game).find_win(2) is not None
+
+    # Blocking further out at (7, 4) or (7, 10) still lets white make an open four
+    ai = GomokuAI(game, max_depth=1, collect_stats=True)
+    assert ai.get_best_move() in ((7, 5), (7, 9))
+    assert ai.stats.source == 'threat'